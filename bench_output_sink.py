@@ -0,0 +1,48 @@
+# 共享输出模块的吞吐基准测试：逐行print与各种输出的对比
+# 用法：python bench_output_sink.py [行数] [线程数]
+import os
+import sys
+import time
+import tempfile
+import threading
+from contextlib import redirect_stdout
+
+from output_sink import StdoutSink, BufferedSink, NullSink, MemorySink, AsyncFileSink, use_sink, emit
+
+
+def run(sink, n_lines, n_threads):
+    def task():
+        for _ in range(n_lines // n_threads):
+            emit('Bake for 25 minutes at 350')
+
+    with use_sink(sink):
+        threads = [threading.Thread(target=task) for _ in range(n_threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        sink.flush()
+        elapsed = time.perf_counter() - start
+    sink.close()
+    return n_lines / elapsed
+
+
+if __name__ == '__main__':
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print(f'{n_lines:,} lines from {n_threads} threads')
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.path.join(tmp, 'stdout.txt'), 'w', buffering=1) as stdout:
+        # 标准输出重定向到行缓冲的文件（与终端一样每行一次写入），排除终端渲染本身的耗时
+        sinks = [
+            ('print (StdoutSink)', lambda: StdoutSink()),
+            ('BufferedSink', lambda: BufferedSink(stream=stdout)),
+            ('AsyncFileSink', lambda: AsyncFileSink(os.path.join(tmp, 'async.txt'))),
+            ('MemorySink', lambda: MemorySink()),
+            ('NullSink', lambda: NullSink()),
+        ]
+        for name, make_sink in sinks:
+            with redirect_stdout(stdout):
+                ops = run(make_sink(), n_lines, n_threads)
+            print(f'{name:<22}{ops:>14,.0f} lines/s')
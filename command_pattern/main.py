@@ -2,25 +2,32 @@
 
 
 # 代码实现
+import os
+import sys
 from abc import ABC, abstractmethod
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit
+
 
 # 灯
 class Light:
     def on(self):
-        print('Light is on.')
+        emit('Light is on.')
 
     def off(self):
-        print('Light is off.')
+        emit('Light is off.')
 
 
 # 风扇
 class CeilingFan:
     def on(self):
-        print('CeilingFan is on.')
+        emit('CeilingFan is on.')
 
     def off(self):
-        print('CeilingFan is off.')
+        emit('CeilingFan is off.')
 
 
 # 命令（接口类）
@@ -0,0 +1,63 @@
+# 装饰者模式 - 批量计价（订单矩阵 vs 逐个调用cost()）基准测试
+# 用法：python decorator_pattern/bench_batch.py [订单数量]
+import sys
+import time
+import random
+
+from main import HouseBlend, Espresso, DarkRoast, Milk, Mocha, Soy, OrderMatrix
+
+BASES = (HouseBlend, Espresso, DarkRoast)
+CONDIMENTS = (Milk, Mocha, Soy)
+CHUNK = 100_000
+
+
+def random_columns(n, seed=0):
+    rng = random.Random(seed)
+    base_codes = bytes(rng.choices(range(len(BASES)), k=n))
+    counts = {condiment: bytes(rng.choices((0, 0, 1, 1, 2), k=n)) for condiment in CONDIMENTS}
+    return base_codes, counts
+
+
+def build(base_codes, counts, start, stop):
+    beverages = []
+    for i in range(start, stop):
+        beverage = BASES[base_codes[i]]()
+        for condiment in CONDIMENTS:
+            for _ in range(counts[condiment][i]):
+                beverage = condiment(beverage)
+        beverages.append(beverage)
+    return beverages
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    base_codes, counts = random_columns(n)
+
+    # 逐个订单创建装饰者链并调用cost()，分块创建以限制内存，只计cost()的时间
+    chain_seconds, chain_total = 0.0, 0.0
+    for start in range(0, n, CHUNK):
+        beverages = build(base_codes, counts, start, min(start + CHUNK, n))
+        begin = time.perf_counter()
+        chain_total += sum(beverage.cost() for beverage in beverages)
+        chain_seconds += time.perf_counter() - begin
+
+    orders = OrderMatrix(BASES, CONDIMENTS)
+    begin = time.perf_counter()
+    orders.extend_columns(base_codes, counts)
+    load_seconds = time.perf_counter() - begin
+    begin = time.perf_counter()
+    costs = orders.costs_in_units()
+    matrix_seconds = time.perf_counter() - begin
+    matrix_total = sum(costs) / 100
+
+    # 从装饰者链映射到订单矩阵
+    beverages = build(base_codes, counts, 0, min(CHUNK, n))
+    begin = time.perf_counter()
+    OrderMatrix(BASES, CONDIMENTS).extend(beverages)
+    map_seconds = (time.perf_counter() - begin) / len(beverages) * n
+
+    print(f'订单数量：{n}')
+    print(f'{"逐个cost()":<16}{chain_seconds * 1000:>10.1f} ms  合计 ¥{chain_total:,.2f}')
+    print(f'{"订单矩阵":<16}{matrix_seconds * 1000:>10.1f} ms  合计 ¥{matrix_total:,.2f}  ({chain_seconds / matrix_seconds:.0f}x)')
+    print(f'{"按列载入":<16}{load_seconds * 1000:>10.1f} ms')
+    print(f'{"装饰者链映射(估)":<16}{map_seconds * 1000:>10.1f} ms')
@@ -0,0 +1,58 @@
+# 装饰者模式 - 深层调料链（循环展开 vs 逐层递归）基准测试
+# 用法：python decorator_pattern/bench_chain.py [最大深度]
+import sys
+import time
+
+from main import Espresso, Milk, Mocha, Soy, CompiledBeverage
+
+
+# 改造前的实现：每层调料递归调用内层的get_description()和cost()
+class LegacyCondiment:
+    def __init__(self, beverage, description, price):
+        self.beverage = beverage
+        self.description = description
+        self.price = price
+
+    def get_description(self):
+        return f"{self.beverage.get_description()}, {self.description}"
+
+    def cost(self):
+        return self.beverage.cost() + self.price
+
+
+def build(depth, legacy=False):
+    beverage = Espresso()
+    for i in range(depth):
+        condiment = (Milk, Mocha, Soy)[i % 3]
+        beverage = LegacyCondiment(beverage, condiment.__name__, condiment.price) if legacy else condiment(beverage)
+    return beverage
+
+
+def timed(func):
+    start = time.perf_counter()
+    try:
+        func()
+    except RecursionError:
+        return None
+    return time.perf_counter() - start
+
+
+def fmt(seconds):
+    return f'{seconds * 1000:>10.3f}' if seconds is not None else f'{"递归溢出":>8}'
+
+
+if __name__ == '__main__':
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    depths = [10 ** i for i in range(len(str(max_depth))) if 10 ** i <= max_depth]
+
+    print(f'递归深度限制：{sys.getrecursionlimit()}，单位：毫秒')
+    print(f'{"深度":>8} {"递归cost":>10} {"递归描述":>8} {"循环cost":>10} {"循环描述":>8} {"编译":>10} {"编译后cost":>8}')
+    for depth in depths:
+        legacy, beverage = build(depth, legacy=True), build(depth)
+        start = time.perf_counter()
+        compiled = CompiledBeverage.compile(beverage)
+        compile_time = time.perf_counter() - start
+        assert compiled.cost() == beverage.cost()
+        print(f'{depth:>10} {fmt(timed(legacy.cost))} {fmt(timed(legacy.get_description))} '
+              f'{fmt(timed(beverage.cost))} {fmt(timed(beverage.get_description))} '
+              f'{fmt(compile_time)} {fmt(timed(compiled.cost))}')
@@ -0,0 +1,59 @@
+# 装饰者模式 - 规范化饮料配置（共享节点 vs 每个订单一条装饰者链）内存基准测试
+# 用法：python decorator_pattern/bench_intern.py [订单数量]
+import gc
+import sys
+import time
+import random
+import tracemalloc
+
+from main import HouseBlend, Espresso, DarkRoast, Milk, Mocha, Soy, CanonicalBeverage
+
+# 少数几种常见饮料，调料顺序随订单而不同
+MENU = [
+    (Espresso, (Mocha, Soy)),
+    (Espresso, (Soy, Mocha)),
+    (DarkRoast, (Milk,)),
+    (HouseBlend, ()),
+    (HouseBlend, (Mocha, Mocha, Milk)),
+    (DarkRoast, (Soy, Milk, Mocha)),
+]
+
+
+def chain(base, condiments):
+    beverage = base()
+    for condiment in condiments:
+        beverage = condiment(beverage)
+    return beverage
+
+
+def measure(make, orders):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    beverages = [make(base, condiments) for base, condiments in orders]
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, seconds, beverages
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    orders = random.Random(0).choices(MENU, k=n)
+    list_size = sys.getsizeof([None] * n)
+
+    print(f'订单数量：{n}（订单列表本身 {list_size / 1024 ** 2:.1f} MB，已计入）')
+    print(f'{"":<12}{"内存(MB)":>10}{"每单(B)":>10}{"创建(ms)":>10}')
+    results = {}
+    for label, make in (('装饰者链', chain), ('规范节点', CanonicalBeverage)):
+        size, seconds, beverages = measure(make, orders)
+        results[label] = size
+        print(f'{label:<12}{size / 1024 ** 2:>10.1f}{size / n:>10.0f}{seconds * 1000:>10.1f}')
+        if make is CanonicalBeverage:
+            print(f'共享节点数：{CanonicalBeverage.size()}')
+        del beverages
+    print(f'内存节省：{results["装饰者链"] / results["规范节点"]:.1f}x')
+
+    # 订单释放后节点由弱引用注册表自动回收
+    gc.collect()
+    print(f'释放订单后的节点数：{CanonicalBeverage.size()}')
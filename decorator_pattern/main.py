@@ -2,11 +2,21 @@
 # 设计原则：应该对扩展开放，对修改关闭。（开闭原则）
 
 # 代码实现
+import sys
+import weakref
+import operator
+import threading
+from array import array
 from abc import ABC, abstractmethod
 
 
 # 饮料（抽象类）
 class Beverage(ABC):
+    # 是否是使用默认cost()/get_description()的调料，装饰者链可以循环展开到这一层（见CondimentDecorator）
+    _inline_cost = False
+    _inline_description = False
+    _depth = 0  # 装饰者链的层数
+
     def __init__(self):
         self.description = 'Unknown Beverage'
 
@@ -20,75 +30,458 @@ class Beverage(ABC):
 
 # 具体组件 - HouseBlend
 class HouseBlend(Beverage):
+    price = 1.0
+
     def __init__(self):
         self.description = 'HouseBlend'
 
     def cost(self):
-        return 1.0
+        return self.price
 
 
 # 具体组件 - Espresso
 class Espresso(Beverage):
+    price = 1.5
+
     def __init__(self):
         self.description = 'Espresso'
 
     def cost(self):
-        return 1.5
+        return self.price
 
 
 # 具体组件 - DarkRoast
 class DarkRoast(Beverage):
+    price = 1.2
+
     def __init__(self):
         self.description = 'DarkRoast'
 
     def cost(self):
-        return 1.2
+        return self.price
+
+
+# 链的层数不超过这个值时逐层递归（层数少时比循环快），更深的链循环展开
+_MAX_RECURSIVE_DEPTH = 64
 
 
 # 调味装饰者（抽象类）
+# 每个调料在所装饰饮料的价格上加price。链较浅时get_description()和cost()逐层递归调用；
+# 链较深时沿装饰者链循环向内走，链再深也不会超过递归深度限制；重写了这两个方法的调料按它自己的实现计算
 class CondimentDecorator(Beverage):
-    @abstractmethod
-    def get_description(self):
-        pass
+    price = 0.0
+    _inline_cost = True
+    _inline_description = True
 
+    # 定义子类时记下它是否重写了cost()/get_description()，展开时每层只需读一个类属性
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._inline_cost = cls.cost is CondimentDecorator.cost
+        cls._inline_description = cls.get_description is CondimentDecorator.get_description
 
-# 具体调味装饰者 - Milk
-class Milk(CondimentDecorator):
     def __init__(self, beverage: Beverage):
-        self.description = 'Milk'
+        self.description = type(self).__name__
         self.beverage = beverage
 
+    # 被装饰的饮料；赋值时同时记下链的层数，子类自己在__init__中给self.beverage赋值也一样
+    @property
+    def beverage(self):
+        return self._beverage
+
+    @beverage.setter
+    def beverage(self, beverage: Beverage):
+        self._beverage = beverage
+        self._depth = beverage._depth + 1
+
     def get_description(self):
-        return f"{self.beverage.get_description()}, {self.description}"
+        if self._depth <= _MAX_RECURSIVE_DEPTH:
+            return f"{self._beverage.get_description()}, {self.description}"
+        descriptions = []
+        beverage = self
+        while beverage._inline_description:
+            descriptions.append(beverage.description)
+            beverage = beverage._beverage
+        descriptions.append(beverage.get_description())
+        descriptions.reverse()
+        return ', '.join(descriptions)
 
+    # 循环展开时由外向内累加调料价格，最后加上内层饮料的价格（与逐层递归的求和顺序不同，浮点结果可能相差最后一位）
     def cost(self):
-        return self.beverage.cost() + 0.5
+        if self._depth <= _MAX_RECURSIVE_DEPTH:
+            return self._beverage.cost() + self.price
+        extra = 0.0
+        beverage = self
+        while beverage._inline_cost:
+            extra += beverage.price
+            beverage = beverage._beverage
+        return beverage.cost() + extra
+
+
+# 具体调味装饰者 - Milk
+class Milk(CondimentDecorator):
+    price = 0.5
 
 
 # 具体调味装饰者 - Mocha
 class Mocha(CondimentDecorator):
-    def __init__(self, beverage: Beverage):
-        self.description = 'Mocha'
-        self.beverage = beverage
+    price = 0.8
+
+
+# 具体调味装饰者 - Soy
+class Soy(CondimentDecorator):
+    price = 0.3
+
+
+# 展开装饰者链，返回(基础饮料, 由内到外的调料类, 对应的各调料实例的描述)
+def _flatten(beverage: Beverage):
+    condiments = []
+    descriptions = []
+    while isinstance(beverage, CondimentDecorator):
+        condiments.append(type(beverage))
+        descriptions.append(beverage.description)
+        beverage = beverage.beverage
+    condiments.reverse()
+    descriptions.reverse()
+    return beverage, tuple(condiments), tuple(descriptions)
+
+
+# 压平后按类的price计价、按各调料的description拼接描述，要求调料没有重写cost()（及get_description()）
+def _check_condiments(condiments, description=True):
+    for condiment in condiments:
+        if not condiment._inline_cost:
+            raise ValueError(f'{condiment.__name__} overrides cost(), its price cannot be derived from the price attribute')
+        if description and not condiment._inline_description:
+            raise ValueError(f'{condiment.__name__} overrides get_description(), its description cannot be precomputed')
+
+
+# 编译后的饮料：把装饰者链压平成不可变记录（基础饮料、各调料份数、总价、描述），
+# cost()和get_description()直接返回预先算好的值；add()追加一份调料时在原记录上增量计算出新记录，
+# 只复制份数表（与调料种类数有关，与份数无关），描述在第一次用到时沿原记录拼接
+class CompiledBeverage(Beverage):
+    def __init__(self, base: Beverage, counts, cost, description, parent=None):
+        object.__setattr__(self, 'base', base)  # 基础饮料
+        object.__setattr__(self, '_counts', counts)  # 调料类 -> 份数
+        object.__setattr__(self, '_cost', cost)
+        # (原记录, 新加调料的描述)，没有原记录时是(None, 完整描述)；拼接后整体替换，其他线程不会读到一半
+        object.__setattr__(self, '_description', (parent, description))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    # 压平装饰者链；调料重写了cost()或get_description()时抛出ValueError
+    @classmethod
+    def compile(cls, beverage: Beverage):
+        if isinstance(beverage, CompiledBeverage):
+            return beverage
+        chain = beverage
+        beverage, condiments, descriptions = _flatten(chain)
+        _check_condiments(condiments)
+        cost = chain.cost()  # 与链本身的cost()结果完全一致
+        counts = {}
+        for condiment in condiments:
+            counts[condiment] = counts.get(condiment, 0) + 1
+        return cls(beverage, counts, cost, ', '.join((beverage.get_description(),) + descriptions))
+
+    @property
+    def description(self):
+        parent, description = self._description
+        if parent is not None:
+            pieces = [description]
+            while parent is not None:
+                parent, description = parent._description
+                pieces.append(description)
+            pieces.reverse()
+            object.__setattr__(self, '_description', (None, ', '.join(pieces)))
+        return self._description[1]
 
     def get_description(self):
-        return f"{self.beverage.get_description()}, {self.description}"
+        return self.description
 
     def cost(self):
-        return self.beverage.cost() + 0.8
+        return self._cost
 
+    # 各调料的份数
+    def counts(self):
+        return dict(self._counts)
 
-# 具体调味装饰者 - Soy
-class Soy(CondimentDecorator):
-    def __init__(self, beverage: Beverage):
-        self.description = 'Soy'
-        self.beverage = beverage
+    # 在外层再加一份调料，返回新的记录；描述与新建的调料实例一致
+    def add(self, condiment):
+        _check_condiments((condiment,))
+        counts = dict(self._counts)
+        counts[condiment] = counts.get(condiment, 0) + 1
+        return CompiledBeverage(self.base, counts, self._cost + condiment.price,
+                                _condiment_description(condiment), parent=self)
+
+
+# 调料类新建实例时的描述（子类可以在__init__中设置自己的description），按类缓存
+_condiment_descriptions = {}
+
+
+def _condiment_description(condiment):
+    description = _condiment_descriptions.get(condiment)
+    if description is None:
+        description = _condiment_descriptions[condiment] = condiment(HouseBlend()).description
+    return description
+
+
+# 价格换算成整数（分）后计算，求和结果与相加顺序无关
+PRICE_SCALE = 100
+
+
+def _price_units(beverage_class):
+    units = round(beverage_class.price * PRICE_SCALE)
+    if abs(units - beverage_class.price * PRICE_SCALE) > 1e-6:
+        raise ValueError(f'price of {beverage_class.__name__} is not a multiple of 1/{PRICE_SCALE}')
+    return units
+
+
+def _condiment_order(condiment):
+    return condiment.__module__, condiment.__qualname__
+
+
+# 规范化的饮料配置（哈希一致化）：基础饮料 + 调料多重集合（与添加顺序无关）相同的订单共享同一个不可变节点。
+# 调料按固定顺序排序后从基础饮料开始逐层查找或创建节点，每个节点只记录父节点（少一份调料）和新加的调料，
+# 相同前缀的配置共享节点；总价（按整数分累加）在节点创建时算好，描述在第一次使用时算好并缓存。
+# 注册表只弱引用节点，没有订单再使用某个配置时节点自动回收
+class CanonicalBeverage(Beverage):
+    _instances = weakref.WeakValueDictionary()  # (基础饮料类,) 或 (父节点, 调料类, 调料描述) -> 节点
+    _configurations = weakref.WeakValueDictionary()  # (基础饮料类, 排好序的(调料类, 调料描述)或排好序的调料类) -> 节点，已有配置一次查到
+    _lock = threading.Lock()
+
+    # descriptions为各调料的描述，省略时使用调料类新建实例时的描述
+    def __new__(cls, base, condiments=(), descriptions=None):
+        if descriptions is None:
+            # 描述由类决定：先按(基础饮料类, 排好序的调料类)查找，已有配置不必再取各调料的描述
+            classes = tuple(sorted(condiments, key=_condiment_order))
+            node = cls._configurations.get((base, classes))
+            if node is not None:
+                return node
+            items = tuple([(condiment, _condiment_description(condiment)) for condiment in classes])
+        else:
+            classes = None
+            items = tuple(sorted(zip(condiments, descriptions), key=lambda item: (_condiment_order(item[0]), item[1])))
+        key = (base, items)
+        node = cls._configurations.get(key)
+        if node is None:
+            with cls._lock:
+                node = cls._node((base,), base, None, None, None)
+                for condiment, description in items:
+                    node = cls._node((node, condiment, description), base, node, condiment, description)
+                cls._configurations[key] = node
+        if classes is not None:
+            cls._configurations[(base, classes)] = node
+        return node
+
+    # 查找或创建一个节点（调用方持有锁）
+    @classmethod
+    def _node(cls, key, base, parent, condiment, condiment_description):
+        node = cls._instances.get(key)
+        if node is None:
+            node = super().__new__(cls)
+            object.__setattr__(node, 'base', base)  # 基础饮料类
+            object.__setattr__(node, 'parent', parent)
+            object.__setattr__(node, 'condiment', condiment)  # 相对父节点多出的调料类
+            object.__setattr__(node, 'condiment_description', condiment_description)  # 这份调料的描述
+            units = _price_units(base) if parent is None else parent.units + _price_units(condiment)
+            object.__setattr__(node, 'units', units)
+            object.__setattr__(node, '_description', None)
+            cls._instances[key] = node
+        return node
+
+    # 节点在__new__中初始化，这里不能再调用Beverage.__init__覆盖描述
+    def __init__(self, base, condiments=(), descriptions=None):
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    # 排好序的调料节点（沿父节点向上收集）
+    def _path(self):
+        nodes = []
+        node = self
+        while node.parent is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    # 排好序的调料类
+    @property
+    def condiments(self):
+        return tuple(node.condiment for node in self._path())
+
+    # 与condiments对应的各调料描述
+    @property
+    def descriptions(self):
+        return tuple(node.condiment_description for node in self._path())
+
+    @property
+    def description(self):
+        return self.get_description()
 
     def get_description(self):
-        return f"{self.beverage.get_description()}, {self.description}"
+        if self._description is None:
+            description = ', '.join([self.base().get_description()] + list(self.descriptions))
+            object.__setattr__(self, '_description', description)
+        return self._description
+
+    # 装饰者链（或CompiledBeverage）对应的规范节点，描述取自链上各调料实例；
+    # 调料重写了cost()或get_description()时结果可能与顺序有关，不能规范化
+    @classmethod
+    def from_beverage(cls, beverage: Beverage):
+        if isinstance(beverage, CanonicalBeverage):
+            return beverage
+        if isinstance(beverage, CompiledBeverage):
+            base = beverage.base
+            condiments = [condiment for condiment, count in beverage.counts().items() for _ in range(count)]
+            descriptions = None
+        else:
+            base, condiments, descriptions = _flatten(beverage)
+        _check_condiments(condiments)
+        return cls(type(base), condiments, descriptions)
 
     def cost(self):
-        return self.beverage.cost() + 0.3
+        return self.units / PRICE_SCALE
+
+    def add(self, condiment):
+        _check_condiments((condiment,))
+        return CanonicalBeverage(self.base, self.condiments + (condiment,),
+                                 self.descriptions + (_condiment_description(condiment),))
+
+    @classmethod
+    def size(cls):
+        return len(cls._instances)
+
+
+_ALL_BYTES = bytes(range(256))
+
+
+# 列中的最大份数：translate删除列中出现过的字节值，剩下的是没出现的值，一次C层扫描即可
+def _max_byte(column):
+    missing = _ALL_BYTES.translate(None, column)
+    return max(set(_ALL_BYTES).difference(missing), default=0)
+
+
+# 订单矩阵：每行一个订单，按列存放（基础饮料编码一列，每种调料的份数一列，每行1个字节）。
+# 价格向量由各饮料/调料类的price得到；costs_in_units()把每列展开成宽度固定的整数通道并拼成一个大整数，
+# 各列乘以单价后相加，一次算出所有订单的总价，不为每个订单调用cost()
+class OrderMatrix:
+    def __init__(self, bases=(), condiments=()):
+        self.bases = []  # 基础饮料类，下标即编码
+        self.condiments = []  # 调料类
+        self.base_codes = bytearray()
+        self.counts = []  # 与condiments对应，每种调料一列
+        self._base_index = {}
+        self._condiment_index = {}
+        for base in bases:
+            self._base_code(base)
+        for condiment in condiments:
+            self._condiment_column(condiment)
+
+    def __len__(self):
+        return len(self.base_codes)
+
+    def _base_code(self, base):
+        code = self._base_index.get(base)
+        if code is None:
+            if len(self.bases) > 255:
+                raise ValueError('OrderMatrix supports at most 256 base beverages')
+            code = self._base_index[base] = len(self.bases)
+            self.bases.append(base)
+        return code
+
+    def _condiment_column(self, condiment):
+        column = self._condiment_index.get(condiment)
+        if column is None:
+            column = self._condiment_index[condiment] = len(self.condiments)
+            self.condiments.append(condiment)
+            self.counts.append(bytearray(len(self)))
+        return self.counts[column]
+
+    # 追加一个订单：base为基础饮料类，counts为{调料类: 份数}；先检查整行，出错时矩阵不变
+    def add_order(self, base, counts=None):
+        # 先把所有数量转换为整数并检查范围（1.5之类的非整数抛出TypeError），任何一列追加之前就拒绝
+        counts = {condiment: operator.index(count) for condiment, count in (counts or {}).items()}
+        for condiment, count in counts.items():
+            if not 0 <= count <= 255:
+                raise ValueError(f'{condiment.__name__} count {count} out of range, OrderMatrix stores 0-255 per condiment')
+        code = self._base_code(base)
+        for condiment in counts:
+            self._condiment_column(condiment)
+        self.base_codes.append(code)
+        for condiment, column in zip(self.condiments, self.counts):
+            column.append(counts.get(condiment, 0))
+
+    # 追加一个装饰者链（或CompiledBeverage、CanonicalBeverage）对应的订单；调料重写了cost()时抛出ValueError
+    def add(self, beverage: Beverage):
+        if isinstance(beverage, CompiledBeverage):
+            self.add_order(type(beverage.base), beverage.counts())
+            return
+        if isinstance(beverage, CanonicalBeverage):
+            base, condiments = beverage.base, beverage.condiments
+        else:
+            base, condiments, _ = _flatten(beverage)
+            _check_condiments(condiments, description=False)
+            base = type(base)
+        counts = {}
+        for condiment in condiments:
+            counts[condiment] = counts.get(condiment, 0) + 1
+        self.add_order(base, counts)
+
+    def extend(self, beverages):
+        for beverage in beverages:
+            self.add(beverage)
+
+    # 直接追加按列编码的订单：base_codes为基础饮料编码（bytes），counts为{调料类: 份数列（bytes）}
+    def extend_columns(self, base_codes, counts=None):
+        counts = counts or {}
+        n = len(base_codes)
+        if any(len(column) != n for column in counts.values()):
+            raise ValueError('all columns must have the same length')
+        if n and max(base_codes) >= len(self.bases):
+            raise ValueError(f'base code out of range, {len(self.bases)} base beverages registered')
+        for condiment in counts:
+            self._condiment_column(condiment)
+        self.base_codes.extend(base_codes)
+        for condiment, column in zip(self.condiments, self.counts):
+            column.extend(counts.get(condiment, bytes(n)))
+
+    def price_vector(self):
+        return [_price_units(base) for base in self.bases], [_price_units(condiment) for condiment in self.condiments]
+
+    # 每个订单的总价（单位：1/PRICE_SCALE元），返回array。
+    # 通道宽度按本批订单可能的最高价选取（1/2/4/8字节），通道越窄要转换和相乘的整数越小
+    def costs_in_units(self):
+        n = len(self)
+        base_prices, condiment_prices = self.price_vector()
+        condiment_prices = [(column, price) for column, price in zip(self.counts, condiment_prices) if price and any(column)]
+        bound = max(base_prices, default=0) + sum(_max_byte(column) * price for column, price in condiment_prices)
+        typecode = next((typecode for typecode in 'BHIQ' if bound < 1 << 8 * array(typecode).itemsize), None)
+        if typecode is None:
+            raise ValueError('order total out of range')
+        width = array(typecode).itemsize
+
+        # 基础饮料编码经转换表直接变成价格的各个字节，放在同一个通道里
+        data = bytearray(n * width)
+        for offset in range(width):
+            table = bytes((base_prices[code] >> 8 * offset) & 0xFF if code < len(base_prices) else 0 for code in range(256))
+            data[offset::width] = self.base_codes.translate(table)
+        total = int.from_bytes(data, 'little')
+        for column, price in condiment_prices:
+            data = bytearray(n * width)
+            data[::width] = column
+            total += int.from_bytes(data, 'little') * price
+        costs = array(typecode, total.to_bytes(n * width, 'little'))
+        if sys.byteorder == 'big':
+            costs.byteswap()
+        return costs
+
+    # 每个订单的总价（元）
+    def costs(self):
+        return array('d', map(PRICE_SCALE.__rtruediv__, self.costs_in_units()))
+
+    def total(self):
+        return sum(self.costs_in_units()) / PRICE_SCALE
 
 
 if __name__ == '__main__':
@@ -96,3 +489,16 @@ if __name__ == '__main__':
     beverage = Mocha(beverage)
     beverage = Soy(beverage)
     print(f"{beverage.get_description()} ¥{round(beverage.cost(), 2)}")
+
+    # 编译装饰者链
+    # compiled = CompiledBeverage.compile(beverage).add(Milk)
+    # print(f"{compiled.get_description()} ¥{round(compiled.cost(), 2)}")
+
+    # 批量计价
+    # orders = OrderMatrix()
+    # orders.extend([beverage, Milk(DarkRoast()), HouseBlend()])
+    # print(orders.costs(), orders.total())
+
+    # 规范化的饮料配置：Mocha(Soy(Espresso()))与Soy(Mocha(Espresso()))共享同一个节点
+    # drink = CanonicalBeverage.from_beverage(beverage)
+    # print(drink is CanonicalBeverage(Espresso, (Soy, Mocha)), drink.get_description(), drink.cost())
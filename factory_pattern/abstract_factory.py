@@ -2,91 +2,117 @@
 
 
 # 代码实现
+import os
+import sys
+import time
+import queue
+import bisect
+import hashlib
+import asyncio
+import weakref
+import warnings
+import threading
+import selectors
+import multiprocessing
 from abc import ABC, abstractmethod
+from collections import deque, OrderedDict
+from multiprocessing.connection import wait as wait_connections
+from typing import NamedTuple
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit, emit_many, set_sink, NullSink
 
-# 面团（接口类）
-class Dough(ABC):
-    def __init__(self):
-        self.name = ''
+
+# 原料（基类）：原料不可变且没有实例状态（名称是类属性），每个实现类只创建一个实例（驻留），由所有披萨共享
+class Ingredient:
+    __slots__ = ()
+    name = ''
+    _instances = {}
+
+    def __new__(cls):
+        instance = Ingredient._instances.get(cls)
+        if instance is None:
+            instance = Ingredient._instances.setdefault(cls, super().__new__(cls))
+        return instance
 
     def get(self):
         return self.name
 
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f'{type(self).__name__}()'
+
+
+# 面团（接口类）
+class Dough(Ingredient, ABC):
+    __slots__ = ()
+
 
 # 厚披萨面团（实现类）
 class ThickCrustDough(Dough):
-    def __init__(self):
-        self.name = 'Thick Crust Dough'
+    __slots__ = ()
+    name = 'Thick Crust Dough'
 
 
 # 薄披萨面团（实现类）
 class ThinCrustDough(Dough):
-    def __init__(self):
-        self.name = 'Thin Crust Dough'
+    __slots__ = ()
+    name = 'Thin Crust Dough'
 
 
 # 酱汁（接口类）
-class Sauce(ABC):
-    def __init__(self):
-        self.name = ''
-
-    def get(self):
-        return self.name
+class Sauce(Ingredient, ABC):
+    __slots__ = ()
 
 
 # 李子番茄酱（实现类）
 class PlumTomatoSauce(Sauce):
-    def __init__(self):
-        self.name = 'Plum Tomato Sauce'
+    __slots__ = ()
+    name = 'Plum Tomato Sauce'
 
 
 # 海员式沙司酱（实现类）
 class MarinaraSauce(Sauce):
-    def __init__(self):
-        self.name = 'Marinara Sauce'
+    __slots__ = ()
+    name = 'Marinara Sauce'
 
 
 # 蛤蜊（接口类）
-class Clam(ABC):
-    def __init__(self):
-        self.name = ''
-
-    def get(self):
-        return self.name
+class Clam(Ingredient, ABC):
+    __slots__ = ()
 
 
 # 冰冻蛤蜊（实现类）
 class FrozenClam(Clam):
-    def __init__(self):
-        self.name = 'Frozen Clam'
+    __slots__ = ()
+    name = 'Frozen Clam'
 
 
 # 新鲜蛤蜊（实现类）
 class FreshClam(Clam):
-    def __init__(self):
-        self.name = 'Fresh Clam'
+    __slots__ = ()
+    name = 'Fresh Clam'
 
 
 # 芝士（接口类）
-class Cheese(ABC):
-    def __init__(self):
-        self.name = ''
-
-    def get(self):
-        return self.name
+class Cheese(Ingredient, ABC):
+    __slots__ = ()
 
 
 # 马苏里拉芝士（实现类）
 class MozzarellaCheese(Cheese):
-    def __init__(self):
-        self.name = 'Mozzarella Cheese'
+    __slots__ = ()
+    name = 'Mozzarella Cheese'
 
 
 # 巴马干酪芝士（实现类）
 class ReggianoCheese(Cheese):
-    def __init__(self):
-        self.name = 'Reggiano Cheese'
+    __slots__ = ()
+    name = 'Reggiano Cheese'
 
 
 # 披萨原料工厂类（接口类）
@@ -119,13 +145,13 @@ class PizzaIngredientFactory(ABC):
 # 纽约披萨原料工厂类（实现类）
 class NewYorkPizzaIngredientFactory(PizzaIngredientFactory):
     def create_dough(self):
-        return ThinCrustDough().get()
+        return ThinCrustDough()
 
     def create_sauce(self):
-        return MarinaraSauce().get()
+        return MarinaraSauce()
 
     def create_cheese(self):
-        return ReggianoCheese().get()
+        return ReggianoCheese()
 
     def create_veggies(self):
         pass
@@ -134,19 +160,19 @@ class NewYorkPizzaIngredientFactory(PizzaIngredientFactory):
         pass
 
     def create_clam(self):
-        return FreshClam().get()
+        return FreshClam()
 
 
 # 芝加哥披萨原料工厂类（实现类）
 class ChicagoPizzaIngredientFactory(PizzaIngredientFactory):
     def create_dough(self):
-        return ThickCrustDough().get()
+        return ThickCrustDough()
 
     def create_sauce(self):
-        return PlumTomatoSauce().get()
+        return PlumTomatoSauce()
 
     def create_cheese(self):
-        return MozzarellaCheese().get()
+        return MozzarellaCheese()
 
     def create_veggies(self):
         pass
@@ -155,19 +181,75 @@ class ChicagoPizzaIngredientFactory(PizzaIngredientFactory):
         pass
 
     def create_clam(self):
-        return FrozenClam().get()
+        return FrozenClam()
+
+
+# 配方计划：某个原料工厂下某种披萨的全部原料（属性名 -> 原料）和准备过程的输出，编译后不可变
+class RecipePlan(NamedTuple):
+    fields: tuple
+    lines: tuple
+
+    # 一步把全部原料装到披萨上
+    def apply(self, pizza):
+        for field, ingredient in self.fields:
+            setattr(pizza, field, ingredient)
+        emit_many((f'Preparing {pizza.name}',) + self.lines)
+
+
+# 配方编译器：按(原料工厂, 披萨类)缓存配方计划，原料只在第一次编译时通过工厂解析；
+# 工厂配置变化后调用invalidate()使缓存失效
+class RecipeCompiler:
+    _verbs = {'dough': 'Tossing'}  # 其余原料为Adding
+
+    def __init__(self):
+        self._plans = weakref.WeakKeyDictionary()  # 原料工厂 -> {披萨类: 配方计划}
+        self._lock = threading.Lock()
+
+    def compile(self, factory: PizzaIngredientFactory, pizza_class) -> RecipePlan:
+        fields = tuple((field, getattr(factory, f'create_{field}')()) for field in pizza_class.recipe)
+        lines = tuple(f'{self._verbs.get(field, "Adding")} {ingredient}' for field, ingredient in fields)
+        return RecipePlan(fields, lines)
+
+    def plan(self, factory: PizzaIngredientFactory, pizza_class) -> RecipePlan:
+        try:
+            return self._plans[factory][pizza_class]
+        except KeyError:
+            pass
+        plan = self.compile(factory, pizza_class)
+        with self._lock:
+            return self._plans.setdefault(factory, {}).setdefault(pizza_class, plan)
+
+    # 使缓存失效：不传参数时清空全部，只传factory时清空该工厂的全部配方
+    def invalidate(self, factory=None, pizza_class=None):
+        with self._lock:
+            if factory is None:
+                self._plans.clear()
+            elif pizza_class is None:
+                self._plans.pop(factory, None)
+            else:
+                self._plans.get(factory, {}).pop(pizza_class, None)
+
+
+recipe_compiler = RecipeCompiler()
 
 
 # 披萨店的产品类（接口类）
+# 使用__slots__，大量下单时不为每个披萨分配__dict__；__weakref__供对象池检测泄漏
 class Pizza(ABC):
+    __slots__ = ('name', 'dough', 'sauce', 'veggies', 'cheese', 'pepperoni', 'clam', 'recipe_plan', '__weakref__')
+
     def __init__(self):
         self.name = ''
-        self.dough = ''  # 面团
-        self.sauce = ''  # 酱汁
-        self.veggies = []  # 蔬菜
-        self.cheese = ''  # 芝士
-        self.pepperoni = ''  # 香肠
-        self.clam = ''  # 蛤蜊
+        self.dough = None  # 面团
+        self.sauce = None  # 酱汁
+        self.veggies = ()  # 蔬菜（共享空元组，不为每个披萨新建列表）
+        self.cheese = None  # 芝士
+        self.pepperoni = None  # 香肠
+        self.clam = None  # 蛤蜊
+        self.recipe_plan = None  # 配方计划（代替对原料工厂的引用）
+
+    # 各阶段耗时（分钟），供厨房调度模拟使用
+    stage_minutes = {'prepare': 5, 'bake': 25, 'cut': 1, 'box': 1}
 
     # 准备工作（注意：这里变了）
     @abstractmethod
@@ -176,15 +258,15 @@ class Pizza(ABC):
 
     # 烘烤
     def bake(self):
-        print('Bake for 25 minutes at 350')
+        emit('Bake for 25 minutes at 350')
 
     # 切块
     def cut(self):
-        print('Cutting the pizza into diagonal slices')
+        emit('Cutting the pizza into diagonal slices')
 
     # 打包
     def box(self):
-        print('Place pizza in official PizzaStore box')
+        emit('Place pizza in official PizzaStore box')
 
     # 设置名称
     def set_name(self, name):
@@ -197,40 +279,132 @@ class Pizza(ABC):
 
 # 芝士披萨（实现类）
 class CheesePizza(Pizza):
+    __slots__ = ()
+    recipe = ('dough', 'sauce', 'cheese')  # 按顺序从原料工厂获取的原料
+
     def __init__(self, pizza_ingredient_factory: PizzaIngredientFactory):
         super().__init__()
-        self.pizza_ingredient_factory = pizza_ingredient_factory
+        self.recipe_plan = recipe_compiler.plan(pizza_ingredient_factory, type(self))
 
     def prepare(self):
-        print(f'Preparing {self.name}')
-        self.dough = self.pizza_ingredient_factory.create_dough()
-        print(f'Tossing {self.dough}')
-        self.sauce = self.pizza_ingredient_factory.create_sauce()
-        print(f'Adding {self.sauce}')
-        self.cheese = self.pizza_ingredient_factory.create_cheese()
-        print(f'Adding {self.cheese}')
+        self.recipe_plan.apply(self)
 
 
 # 蛤蜊披萨（实现类）
 class ClamPizza(Pizza):
+    __slots__ = ()
+    recipe = ('dough', 'sauce', 'cheese', 'clam')
+
     def __init__(self, pizza_ingredient_factory: PizzaIngredientFactory):
         super().__init__()
-        self.pizza_ingredient_factory = pizza_ingredient_factory
+        self.recipe_plan = recipe_compiler.plan(pizza_ingredient_factory, type(self))
 
     def prepare(self):
-        print(f'Preparing {self.name}')
-        self.dough = self.pizza_ingredient_factory.create_dough()
-        print(f'Tossing {self.dough}')
-        self.sauce = self.pizza_ingredient_factory.create_sauce()
-        print(f'Adding {self.sauce}')
-        self.cheese = self.pizza_ingredient_factory.create_cheese()
-        print(f'Adding {self.cheese}')
-        self.clam = self.pizza_ingredient_factory.create_clam()
-        print(f'Adding {self.clam}')
+        self.recipe_plan.apply(self)
+
+
+# 披萨对象池：打包完成并归还的披萨按类保存，下次同类订单重新初始化后复用；
+# 池满时丢弃归还的披萨。借出后没有归还就被回收的披萨记为泄漏，并发出ResourceWarning
+class PizzaPool:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._free = {}  # 披萨类 -> 空闲披萨列表
+        self._n_free = 0
+        self._outstanding = {}  # id(披萨) -> 弱引用，借出未归还的披萨
+        # 可重入锁：泄漏披萨的弱引用回调可能在已持有锁的线程中（acquire/release内触发垃圾回收时）执行
+        self._lock = threading.RLock()
+        self._stats = {'created': 0, 'reused': 0, 'released': 0, 'discarded': 0, 'leaked': 0}
+
+    def acquire(self, pizza_class, *args):
+        with self._lock:
+            free = self._free.get(pizza_class)
+            pizza = free.pop() if free else None
+            if pizza is not None:
+                self._n_free -= 1
+                self._stats['reused'] += 1
+            else:
+                self._stats['created'] += 1
+        if pizza is None:
+            pizza = pizza_class(*args)
+        else:
+            pizza.__init__(*args)  # 重置所有字段
+        key = id(pizza)
+        with self._lock:
+            self._outstanding[key] = weakref.ref(pizza, lambda _, key=key: self._leaked(key))
+        return pizza
+
+    def _leaked(self, key):
+        with self._lock:
+            if self._outstanding.pop(key, None) is None:
+                return
+            self._stats['leaked'] += 1
+        warnings.warn('pizza acquired from PizzaPool was never released', ResourceWarning)
+
+    def release(self, pizza: Pizza):
+        with self._lock:
+            ref = self._outstanding.get(id(pizza))
+            if ref is None or ref() is not pizza:
+                raise ValueError(f'{pizza!r} was not acquired from this pool or was already released')
+            del self._outstanding[id(pizza)]
+            self._stats['released'] += 1
+            if self._n_free >= self.max_size:
+                self._stats['discarded'] += 1
+                return
+            self._free.setdefault(type(pizza), []).append(pizza)
+            self._n_free += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, free=self._n_free, outstanding=len(self._outstanding), max_size=self.max_size)
 
 
 # 披萨店类（接口类）
+# 每个披萨店有自己的菜单注册表（披萨类型 -> 披萨类和名称），创建披萨只需一次字典查找
 class PizzaStore(ABC):
+    pool = None  # 对象池（可选），通过enable_pool()开启
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._menu = {}  # 披萨类型 -> (披萨类, 名称)
+
+    # 注册菜单项，可以直接调用，也可以作为披萨类的装饰器：@NewYorkPizzaStore.register('veggie', name='...')
+    @classmethod
+    def register(cls, pizza_type, pizza_class=None, name=None):
+        def decorator(pizza_class):
+            cls._menu[pizza_type] = (pizza_class, name)
+            return pizza_class
+
+        return decorator if pizza_class is None else decorator(pizza_class)
+
+    @classmethod
+    def menu(cls):
+        return list(cls._menu)
+
+    # 按类型创建菜单上的披萨，未知类型直接报错
+    def _create_menu_item(self, pizza_type, ingredient_factory: PizzaIngredientFactory) -> Pizza:
+        try:
+            pizza_class, name = self._menu[pizza_type]
+        except KeyError:
+            raise ValueError(f'{type(self).__name__} has no pizza type {pizza_type!r}, '
+                             f'available: {", ".join(map(repr, self._menu))}') from None
+        if self.pool is not None:
+            pizza = self.pool.acquire(pizza_class, ingredient_factory)
+        else:
+            pizza = pizza_class(ingredient_factory)
+        if name is not None:
+            pizza.set_name(name)
+        return pizza
+
+    # 开启对象池：之后通过release()归还的披萨会被复用
+    def enable_pool(self, max_size=1024):
+        self.pool = PizzaPool(max_size)
+        return self.pool
+
+    # 归还已经打包完成、不再使用的披萨
+    def release(self, pizza: Pizza):
+        if self.pool is not None:
+            self.pool.release(pizza)
+
     @abstractmethod
     def _create_pizza(self, pizza_type) -> Pizza:
         pass
@@ -244,33 +418,485 @@ class PizzaStore(ABC):
 
         return pizza
 
+    # 流水线方式批量下单：prepare、bake、cut、box各阶段并发执行，结果以生成器返回
+    # ordered为True时按输入顺序返回，否则按完成顺序返回；需要各阶段统计时直接使用PizzaPipeline
+    def order_pizzas(self, pizza_types, ordered=True, workers=None, queue_size=16):
+        yield from PizzaPipeline(self, workers, queue_size).run(pizza_types, ordered)
+
+    # 异步下单：传入kitchen时，每个阶段都要先占用厨房的烤箱或备餐台，并等待该阶段的耗时
+    async def order_pizza_async(self, pizza_type, kitchen=None):
+        pizza = self._create_pizza(pizza_type)
+        for stage in _STAGES:
+            if kitchen is None:
+                getattr(pizza, stage)()
+            else:
+                await kitchen.run_stage(pizza, stage)
+
+        return pizza
+
+
+_STAGES = ('prepare', 'bake', 'cut', 'box')
+_DONE = object()  # 结束标记
+
+
+# 披萨流水线：每个阶段有自己的工作线程，阶段之间用有界队列连接（队列满时上游阻塞，形成背压）
+class PizzaPipeline:
+    def __init__(self, store: PizzaStore, workers=None, queue_size=16):
+        self.store = store
+        self.workers = dict.fromkeys(_STAGES, 1)  # 各阶段的工作线程数
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._queues = []
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._started = self._finished = None
+        self._processed = dict.fromkeys(_STAGES, 0)
+        self._busy_time = dict.fromkeys(_STAGES, 0.0)
+        self._max_queue_depth = dict.fromkeys(_STAGES, 0)
+
+    def run(self, pizza_types, ordered=True):
+        stop = threading.Event()
+        # queues[i]是第i个阶段的输入队列，最后一个是结果队列
+        queues = self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(_STAGES) + 1)]
+        running = [self.workers[stage] for stage in _STAGES]  # 各阶段还在运行的工作线程数
+        self._reset_stats()
+        self._started = time.perf_counter()
+
+        def put(i, item):
+            while not stop.is_set():
+                try:
+                    queues[i].put(item, timeout=0.1)
+                except queue.Full:
+                    continue
+                if i < len(_STAGES):
+                    with self._lock:
+                        stage = _STAGES[i]
+                        self._max_queue_depth[stage] = max(self._max_queue_depth[stage], queues[i].qsize())
+                return True
+            return False
+
+        def get(i):
+            while not stop.is_set():
+                try:
+                    return queues[i].get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        # 创建披萨并送入第一个阶段
+        def feed():
+            seq = -1  # 最后一个已送入的订单序号，输入出错时错误排在它之后
+            try:
+                for seq, pizza_type in enumerate(pizza_types):
+                    try:
+                        item = (seq, self.store._create_pizza(pizza_type), None)
+                    except Exception as e:
+                        item = (seq, None, e)
+                    if not put(0, item):
+                        return
+            except Exception as e:  # 输入本身出错
+                put(0, (seq + 1, None, e))
+            for _ in range(self.workers[_STAGES[0]]):
+                put(0, _DONE)
+
+        def work(i):
+            stage = _STAGES[i]
+            while True:
+                item = get(i)
+                if item is _DONE:
+                    break
+                seq, pizza, error = item
+                if error is None:  # 出错的订单直接传到结果队列，不再执行后续阶段
+                    start = time.perf_counter()
+                    try:
+                        getattr(pizza, stage)()
+                    except Exception as e:
+                        error = e
+                    elapsed = time.perf_counter() - start
+                    with self._lock:
+                        self._processed[stage] += 1
+                        self._busy_time[stage] += elapsed
+                if not put(i + 1, (seq, pizza, error)):
+                    return
+            with self._lock:
+                running[i] -= 1
+                last = running[i] == 0
+            if last:  # 本阶段最后一个退出的线程通知下一阶段结束
+                for _ in range(self.workers[_STAGES[i + 1]] if i + 1 < len(_STAGES) else 1):
+                    put(i + 1, _DONE)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for i, stage in enumerate(_STAGES):
+            threads += [threading.Thread(target=work, args=[i], daemon=True) for _ in range(self.workers[stage])]
+        for t in threads:
+            t.start()
+
+        try:
+            pending = {}  # 按输入顺序返回时，先完成的订单暂存在这里
+            next_seq = 0
+            while True:
+                item = get(len(_STAGES))
+                if item is _DONE:
+                    break
+                seq, pizza, error = item
+                if not ordered:
+                    if error is not None:
+                        raise error
+                    yield pizza
+                    continue
+                pending[seq] = (pizza, error)
+                while next_seq in pending:
+                    pizza, error = pending.pop(next_seq)
+                    next_seq += 1
+                    if error is not None:
+                        raise error
+                    yield pizza
+        finally:
+            stop.set()  # 正常结束、出错或调用方提前停止迭代时，都让工作线程退出
+            for t in threads:
+                t.join()
+            self._finished = time.perf_counter()
+
+    # 各阶段的处理数量、吞吐量（个/秒）、平均处理时间和输入队列深度
+    def stats(self):
+        with self._lock:
+            if self._started is None:
+                return {}
+            elapsed = (self._finished or time.perf_counter()) - self._started
+            return {
+                stage: {
+                    'workers': self.workers[stage],
+                    'processed': self._processed[stage],
+                    'throughput': self._processed[stage] / elapsed if elapsed > 0 else 0.0,
+                    'avg_service_time': self._busy_time[stage] / self._processed[stage]
+                    if self._processed[stage] else 0.0,
+                    'queue_depth': self._queues[i].qsize(),
+                    'max_queue_depth': self._max_queue_depth[stage],
+                }
+                for i, stage in enumerate(_STAGES)
+            }
+
+
+# 虚拟时间选择器：没有就绪的IO时不真正等待，而是把虚拟时钟直接拨到下一个定时器
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if not events and timeout:
+            self._loop.virtual_time += timeout
+        return events
+
+
+# 虚拟时间事件循环：asyncio.sleep等定时操作立即完成，loop.time()返回模拟的时间
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        self.virtual_time = 0.0
+        super().__init__(_VirtualTimeSelector(self))
+
+    def time(self):
+        return self.virtual_time
+
+
+# 在虚拟时间事件循环中运行协程
+def run_simulated(coro):
+    loop = VirtualTimeEventLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+# 按最近秩法取百分位数
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+# 厨房：包装任意披萨店，用信号量模拟N个烤箱位和M个备餐台，在asyncio上调度订单；
+# bake占用烤箱，prepare、cut、box占用备餐台，每个阶段按Pizza.stage_minutes等待。
+# time_scale是每个模拟分钟对应的事件循环秒数，配合run_simulated()使用虚拟时间时，运行瞬间完成
+class Kitchen:
+    def __init__(self, store: PizzaStore, ovens=2, prep_stations=1, time_scale=60.0):
+        self.store = store
+        self.ovens = ovens
+        self.prep_stations = prep_stations
+        self.time_scale = time_scale
+        self._semaphores = {}
+        self._busy_minutes = {}
+
+    def _now(self):
+        return asyncio.get_running_loop().time() / self.time_scale
+
+    async def run_stage(self, pizza: Pizza, stage):
+        resource = 'ovens' if stage == 'bake' else 'prep_stations'
+        async with self._semaphores[resource]:
+            getattr(pizza, stage)()
+            start = self._now()
+            await asyncio.sleep(pizza.stage_minutes[stage] * self.time_scale)
+            self._busy_minutes[resource] += self._now() - start
+
+    # orders中每一项是披萨类型，或(到达时间（分钟）, 披萨类型)；返回完工时间、资源利用率和订单延迟（分钟）
+    async def run(self, orders):
+        self._semaphores = {'ovens': asyncio.Semaphore(self.ovens),
+                            'prep_stations': asyncio.Semaphore(self.prep_stations)}
+        self._busy_minutes = {'ovens': 0.0, 'prep_stations': 0.0}
+        start = self._now()
+        latencies = []
+
+        async def order(arrival, pizza_type):
+            await asyncio.sleep(arrival * self.time_scale)
+            ordered_at = self._now()
+            await self.store.order_pizza_async(pizza_type, kitchen=self)
+            latencies.append(self._now() - ordered_at)
+
+        await asyncio.gather(*(order(*item) if isinstance(item, tuple) else order(0, item) for item in orders))
+        makespan = self._now() - start
+        latencies.sort()
+        return {
+            'orders': len(latencies),
+            'makespan': makespan,
+            'utilization': {
+                'ovens': self._busy_minutes['ovens'] / (self.ovens * makespan) if makespan else 0.0,
+                'prep_stations': self._busy_minutes['prep_stations'] / (self.prep_stations * makespan)
+                if makespan else 0.0,
+            },
+            'latency': {
+                'p50': _percentile(latencies, 50),
+                'p99': _percentile(latencies, 99),
+                'max': latencies[-1] if latencies else 0.0,
+            },
+        }
+
+    # 在虚拟时间中运行，立即返回结果
+    def simulate(self, orders):
+        return run_simulated(self.run(orders))
+
 
 # 纽约披萨店（实现类）
 class NewYorkPizzaStore(PizzaStore):
-    def _create_pizza(self, pizza_type) -> Pizza:
-        ingredient_factory = NewYorkPizzaIngredientFactory()
-        if pizza_type == 'cheese':
-            pizza = CheesePizza(ingredient_factory)
-            pizza.set_name('New York Style Cheese Pizza')
-        elif pizza_type == 'clam':
-            pizza = ClamPizza(ingredient_factory)
-            pizza.set_name('New York Style Clam Pizza')
+    def __init__(self):
+        self.ingredient_factory = NewYorkPizzaIngredientFactory()
 
-        return pizza
+    def _create_pizza(self, pizza_type) -> Pizza:
+        return self._create_menu_item(pizza_type, self.ingredient_factory)
 
 
 # 芝加哥披萨店（实现类）
 class ChicagoPizzaStore(PizzaStore):
-    def _create_pizza(self, pizza_type) -> Pizza:
-        ingredient_factory = ChicagoPizzaIngredientFactory()
-        if pizza_type == 'cheese':
-            pizza = CheesePizza(ingredient_factory)
-            pizza.set_name('Chicago Style Cheese Pizza')
-        elif pizza_type == 'clam':
-            pizza = ClamPizza(ingredient_factory)
-            pizza.set_name('Chicago Style Clam Pizza')
+    def __init__(self):
+        self.ingredient_factory = ChicagoPizzaIngredientFactory()
 
-        return pizza
+    def _create_pizza(self, pizza_type) -> Pizza:
+        return self._create_menu_item(pizza_type, self.ingredient_factory)
+
+
+NewYorkPizzaStore.register('cheese', CheesePizza, 'New York Style Cheese Pizza')
+NewYorkPizzaStore.register('clam', ClamPizza, 'New York Style Clam Pizza')
+ChicagoPizzaStore.register('cheese', CheesePizza, 'Chicago Style Cheese Pizza')
+ChicagoPizzaStore.register('clam', ClamPizza, 'Chicago Style Clam Pizza')
+
+
+# 一致性哈希环：每个节点在环上有replicas个虚拟节点，增删节点时只有少量key改变归属
+class ConsistentHashRing:
+    def __init__(self, nodes=(), replicas=100, cache_size=1024):
+        self.replicas = replicas
+        self.cache_size = cache_size
+        self._hashes = []  # 有序的虚拟节点哈希值
+        self._nodes = {}  # 虚拟节点哈希值 -> 节点
+        # key -> 节点，按最近使用排序（地区等常用key命中缓存，避免重复计算哈希；顾客key很多时只保留最近的cache_size个）
+        self._cache = OrderedDict()
+        for node in nodes:
+            self.add(node)
+
+    # 稳定的哈希（内置hash()在不同进程中不同）
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            h = self._hash(f'{node}#{i}')
+            self._nodes[h] = node
+            bisect.insort(self._hashes, h)
+        self._cache.clear()
+
+    def remove(self, node):
+        self._hashes = [h for h in self._hashes if self._nodes[h] != node]
+        self._nodes = {h: n for h, n in self._nodes.items() if n != node}
+        self._cache.clear()
+
+    def __len__(self):
+        return len(set(self._nodes.values()))
+
+    def get(self, key):
+        node = self._cache.get(key)
+        if node is not None:
+            self._cache.move_to_end(key)
+            return node
+        if not self._hashes:
+            raise LookupError('hash ring has no nodes')
+        i = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        node = self._cache[key] = self._nodes[self._hashes[i]]
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return node
+
+
+# 工作进程：每个地区持有一个披萨店实例，按批接收订单，按批返回结果（输出直接丢弃）
+def _store_worker(stores, conn):
+    set_sink(NullSink())
+    stores = {region: store_class() for region, store_class in stores.items()}
+    while True:
+        try:
+            batch = conn.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        results = []
+        for order_id, region, pizza_type, _ in batch:
+            try:
+                results.append((order_id, region, pizza_type, stores[region].order_pizza(pizza_type).get_name(), None))
+            except Exception as e:
+                results.append((order_id, region, pizza_type, None, f'{type(e).__name__}: {e}'))
+        conn.send(results)
+    conn.close()
+
+
+# 多进程分片路由：订单按地区（或顾客key）一致性哈希到固定的工作进程，使各进程内的配方缓存等保持热；
+# 订单和结果都按批经管道传输，每个进程最多有max_inflight批未完成（背压）；
+# 工作进程退出时用同一个编号重新启动一个进程，哈希环不变，未完成的订单重新发给新进程；
+# 总共最多重启max_restarts次（默认等于进程数，避免某个订单反复让进程崩溃时无限重启），
+# 之后退出的进程从哈希环上移除，未完成的订单重新路由到其余进程
+class StoreRouter:
+    def __init__(self, stores=None, n_workers=None, batch_size=256, max_inflight=4, replicas=100, max_restarts=None):
+        self.stores = stores or {'new_york': NewYorkPizzaStore, 'chicago': ChicagoPizzaStore}
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        n_workers = n_workers or os.cpu_count() or 1
+        self.max_restarts = n_workers if max_restarts is None else max_restarts
+        self.rebalances = 0  # 工作进程退出、订单重新分发的次数
+        self.restarts = 0  # 其中重启了工作进程的次数
+        self._ring = ConsistentHashRing(replicas=replicas)
+        self._workers = {}  # 工作进程编号 -> (进程, 管道)
+        self._batches = {}  # 工作进程编号 -> 待发送的订单
+        self._inflight = {}  # 工作进程编号 -> 已发送未返回的批次
+        for worker_id in range(n_workers):
+            self._start_worker(worker_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_worker(self, worker_id):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_store_worker, args=(self.stores, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[worker_id] = (process, conn)
+        self._batches[worker_id] = []
+        self._inflight[worker_id] = deque()
+        self._ring.add(worker_id)
+
+    def workers(self):
+        return list(self._workers)
+
+    # key对应的工作进程编号
+    def route(self, key):
+        return self._ring.get(key)
+
+    def _enqueue(self, order):
+        worker_id = self._ring.get(order[3])
+        batch = self._batches[worker_id]
+        batch.append(order)
+        return worker_id if len(batch) >= self.batch_size else None
+
+    def _send(self, worker_id):
+        while worker_id in self._workers and len(self._inflight[worker_id]) >= self.max_inflight:
+            yield from self._receive()
+        if worker_id not in self._workers:  # 等待期间进程退出，订单已经重新路由
+            return
+        batch, self._batches[worker_id] = self._batches[worker_id], []
+        try:
+            self._workers[worker_id][1].send(batch)
+        except OSError:
+            self._batches[worker_id] = batch
+            self._handle_death(worker_id)
+            return
+        self._inflight[worker_id].append(batch)
+
+    def _receive(self):
+        waitables = {}
+        for worker_id, (process, conn) in self._workers.items():
+            if self._inflight[worker_id]:
+                waitables[conn] = worker_id
+                waitables[process.sentinel] = worker_id
+        for ready in wait_connections(list(waitables)):
+            worker_id = waitables[ready]
+            if worker_id not in self._workers:
+                continue
+            process, conn = self._workers[worker_id]
+            try:
+                while conn.poll():  # 进程退出前可能已经发回了一些结果
+                    results = conn.recv()
+                    self._inflight[worker_id].popleft()
+                    yield from results
+            except (EOFError, OSError):
+                pass
+            if not process.is_alive():
+                self._handle_death(worker_id)
+
+    def _handle_death(self, worker_id):
+        process, conn = self._workers.pop(worker_id)
+        conn.close()
+        process.join()
+        self._ring.remove(worker_id)
+        orders = [order for batch in self._inflight.pop(worker_id) for order in batch] + self._batches.pop(worker_id)
+        self.rebalances += 1
+        if self.restarts < self.max_restarts:
+            self.restarts += 1
+            self._start_worker(worker_id)
+        if not self._workers:
+            raise RuntimeError('all store workers have died')
+        for order in orders:
+            self._enqueue(order)
+
+    # orders中每一项是(地区, 披萨类型)或(地区, 披萨类型, 顾客key)，没有顾客key时按地区路由；
+    # 按完成顺序返回(订单号, 地区, 披萨类型, 披萨名称, 错误信息)，订单号是订单在orders中的下标
+    def order_pizzas(self, orders):
+        for order_id, order in enumerate(orders):
+            region, pizza_type = order[0], order[1]
+            worker_id = self._enqueue((order_id, region, pizza_type, order[2] if len(order) > 2 else region))
+            if worker_id is not None:
+                yield from self._send(worker_id)
+        while any(self._batches.values()) or any(self._inflight.values()):
+            for worker_id in list(self._workers):
+                if worker_id in self._workers and self._batches[worker_id]:
+                    yield from self._send(worker_id)
+            if any(self._inflight.values()):
+                yield from self._receive()
+
+    def close(self):
+        for process, conn in self._workers.values():
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._workers.clear()
 
 
 if __name__ == '__main__':
@@ -279,3 +905,18 @@ if __name__ == '__main__':
 
     chicago_store = ChicagoPizzaStore()
     chicago_store.order_pizza('cheese')
+
+    # 流水线批量下单
+    # pipeline = PizzaPipeline(chicago_store, workers={'bake': 4})
+    # for pizza in pipeline.run(['cheese', 'clam'] * 10, ordered=False):
+    #     print(pizza.get_name())
+    # print(pipeline.stats())
+
+    # 厨房调度模拟：2个烤箱、1个备餐台，20个订单
+    # kitchen = Kitchen(newyork_store, ovens=2, prep_stations=1)
+    # print(kitchen.simulate(['cheese', 'clam'] * 10))
+
+    # 多进程分片路由
+    # with StoreRouter(n_workers=4) as router:
+    #     for result in router.order_pizzas([('new_york', 'cheese'), ('chicago', 'clam')] * 1000):
+    #         pass
@@ -0,0 +1,40 @@
+# 工厂方法模式 - 菜单注册表与if/elif分支的查找开销基准测试
+# 用法：python factory_pattern/bench_dispatch.py [每种规模的查找次数]
+import sys
+import timeit
+
+from factory import PizzaStore, Pizza
+
+
+# 生成包含n个分支的if/elif链（改造前_create_pizza的写法）
+def make_chain(n):
+    lines = ['def create(pizza_type):']
+    for i in range(n):
+        lines.append(f"    {'if' if i == 0 else 'elif'} pizza_type == 'pizza{i}':")
+        lines.append(f'        return Pizza()')
+    namespace = {'Pizza': Pizza}
+    exec('\n'.join(lines), namespace)
+    return namespace['create']
+
+
+def make_store(n):
+    class BenchPizzaStore(PizzaStore):
+        def _create_pizza(self, pizza_type):
+            return self._create_menu_item(pizza_type)
+
+    for i in range(n):
+        BenchPizzaStore.register(f'pizza{i}', Pizza)
+    return BenchPizzaStore()
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{'menu size':>10}{'chain (first)':>16}{'chain (last)':>16}{'registry':>12}")
+    for n in [2, 10, 100, 1000]:
+        chain = make_chain(n)
+        store = make_store(n)
+        first, last = 'pizza0', f'pizza{n - 1}'
+        chain_first = timeit.timeit(lambda: chain(first), number=number) / number
+        chain_last = timeit.timeit(lambda: chain(last), number=number) / number
+        registry = timeit.timeit(lambda: store._create_pizza(last), number=number) / number
+        print(f'{n:>10}{chain_first * 1e9:>14.0f}ns{chain_last * 1e9:>14.0f}ns{registry * 1e9:>10.0f}ns')
@@ -0,0 +1,66 @@
+# 抽象工厂模式 - 原料驻留的分配基准测试（tracemalloc）
+# 用法：python factory_pattern/bench_ingredients.py [订单数]
+import sys
+import time
+import tracemalloc
+
+from abstract_factory import NewYorkPizzaIngredientFactory, ChicagoPizzaIngredientFactory
+
+
+# 不驻留的对照实现：每次create_*都新建一个原料对象
+class PlainIngredient:
+    def __init__(self, name):
+        self.name = name
+
+
+class PlainNewYorkPizzaIngredientFactory:
+    def create_dough(self):
+        return PlainIngredient('Thin Crust Dough')
+
+    def create_sauce(self):
+        return PlainIngredient('Marinara Sauce')
+
+    def create_cheese(self):
+        return PlainIngredient('Reggiano Cheese')
+
+    def create_clam(self):
+        return PlainIngredient('Fresh Clam')
+
+
+def order_ingredients(factory):
+    return factory.create_dough(), factory.create_sauce(), factory.create_cheese(), factory.create_clam()
+
+
+# 保留每个订单的原料，统计每个订单新增的内存块数和字节数（包括装原料的元组本身：1块）
+def allocations(factory, n):
+    orders = [None] * n
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(n):
+        orders[i] = order_ingredients(factory)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = [stat for stat in after.compare_to(before, 'filename')
+            if not stat.traceback[0].filename.startswith('<')]
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    return blocks / n, size / n
+
+
+def throughput(factory, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        order_ingredients(factory)
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f'{n:,} orders')
+    print(f"{'factory':<36}{'blocks/order':>14}{'bytes/order':>14}{'orders/s':>14}")
+    for name, factory in [('not interned', PlainNewYorkPizzaIngredientFactory()),
+                          ('NewYorkPizzaIngredientFactory', NewYorkPizzaIngredientFactory()),
+                          ('ChicagoPizzaIngredientFactory', ChicagoPizzaIngredientFactory())]:
+        blocks, size = allocations(factory, n)
+        ops = throughput(factory, n)
+        print(f'{name:<36}{blocks:>14.2f}{size:>14.1f}{ops:>14,.0f}')
@@ -0,0 +1,46 @@
+# 抽象工厂模式 - 披萨对象池的内存/GC基准测试
+# 用法：python factory_pattern/bench_pool.py [订单数]
+import gc
+import sys
+import time
+import tracemalloc
+
+from abstract_factory import NewYorkPizzaStore
+from output_sink import use_sink, NullSink
+
+
+def run(store, n, release):
+    start = time.perf_counter()
+    for i in range(n):
+        pizza = store.order_pizza('cheese' if i % 2 else 'clam')
+        if release:
+            store.release(pizza)
+    return n / (time.perf_counter() - start)
+
+
+# 下单过程中的内存峰值（tracemalloc）
+def peak_memory(store, n, release):
+    gc.collect()
+    tracemalloc.start()
+    run(store, n, release)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with use_sink(NullSink()):
+        print(f'{n:,} orders, {sys.getsizeof(NewYorkPizzaStore().order_pizza("cheese"))} bytes per pizza')
+        print(f"{'variant':<12}{'orders/s':>12}{'peak memory':>14}{'gen0 gc runs':>14}")
+        for name, pooled in [('no pool', False), ('pool', True)]:
+            store = NewYorkPizzaStore()
+            if pooled:
+                store.enable_pool(max_size=64)
+            gc.collect()
+            collections = gc.get_stats()[0]['collections']
+            ops = run(store, n, pooled)
+            collections = gc.get_stats()[0]['collections'] - collections
+            peak = peak_memory(store, n, pooled)
+            print(f'{name:<12}{ops:>12,.0f}{peak / 1024:>12.1f}KB{collections:>14}')
+            if pooled:
+                print(store.pool.stats())
@@ -0,0 +1,36 @@
+# 抽象工厂模式 - 多进程分片路由的吞吐基准测试
+# 用法：python factory_pattern/bench_router.py [订单数] [最大工作进程数]
+import os
+import sys
+import time
+
+from abstract_factory import NewYorkPizzaStore, ChicagoPizzaStore, StoreRouter
+from output_sink import use_sink, NullSink
+
+
+def make_orders(n):
+    regions = ['new_york', 'chicago']
+    return [(regions[i % 2], 'cheese' if i % 3 else 'clam', f'customer{i % 1000}') for i in range(n)]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    orders = make_orders(n)
+    print(f'{n:,} orders, {os.cpu_count()} cores')
+
+    stores = {'new_york': NewYorkPizzaStore(), 'chicago': ChicagoPizzaStore()}
+    with use_sink(NullSink()):
+        start = time.perf_counter()
+        for region, pizza_type, _ in orders:
+            stores[region].order_pizza(pizza_type)
+        print(f"{'single process':<20}{n / (time.perf_counter() - start):>14,.0f} orders/s")
+
+    n_workers = 1
+    while n_workers <= max_workers:
+        with StoreRouter(n_workers=n_workers, batch_size=512) as router:
+            start = time.perf_counter()
+            for _ in router.order_pizzas(orders):
+                pass
+            print(f"{f'router ({n_workers} workers)':<20}{n / (time.perf_counter() - start):>14,.0f} orders/s")
+        n_workers *= 2
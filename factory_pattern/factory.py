@@ -3,8 +3,15 @@
 
 
 # 代码实现
+import os
+import sys
 from abc import ABC, abstractmethod
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit
+
 
 # 披萨店的产品类（接口类）
 class Pizza(ABC):
@@ -16,24 +23,24 @@ class Pizza(ABC):
 
     # 准备工作
     def prepare(self):
-        print(f'Preparing {self.name}')
-        print(f'Tossing dough...')
-        print(f'Adding sauce...')
-        print(f'Adding toppings: ')
+        emit(f'Preparing {self.name}')
+        emit(f'Tossing dough...')
+        emit(f'Adding sauce...')
+        emit(f'Adding toppings: ')
         for topping in self.toppings:
-            print(f'  {topping}')
+            emit(f'  {topping}')
 
     # 烘烤
     def bake(self):
-        print('Bake for 25 minutes at 350')
+        emit('Bake for 25 minutes at 350')
 
     # 切块
     def cut(self):
-        print('Cutting the pizza into diagonal slices')
+        emit('Cutting the pizza into diagonal slices')
 
     # 打包
     def box(self):
-        print('Place pizza in official PizzaStore box')
+        emit('Place pizza in official PizzaStore box')
 
     # 获取名称
     def get_name(self):
@@ -60,11 +67,41 @@ class ChicagoStyleCheesePizza(Pizza):
         self.toppings.append('Shredded Mozzarella Cheese')
 
     def cut(self):
-        print('Cutting the pizza into square slices')
+        emit('Cutting the pizza into square slices')
 
 
 # 披萨店类（接口类）
+# 每个披萨店有自己的菜单注册表（披萨类型 -> 披萨类），创建披萨只需一次字典查找
 class PizzaStore(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._menu = {}  # 披萨类型 -> (披萨类, 名称)
+
+    # 注册菜单项，可以直接调用，也可以作为披萨类的装饰器：@NewYorkPizzaStore.register('veggie')
+    @classmethod
+    def register(cls, pizza_type, pizza_class=None, name=None):
+        def decorator(pizza_class):
+            cls._menu[pizza_type] = (pizza_class, name)
+            return pizza_class
+
+        return decorator if pizza_class is None else decorator(pizza_class)
+
+    @classmethod
+    def menu(cls):
+        return list(cls._menu)
+
+    # 按类型创建菜单上的披萨，未知类型直接报错
+    def _create_menu_item(self, pizza_type) -> Pizza:
+        try:
+            pizza_class, name = self._menu[pizza_type]
+        except KeyError:
+            raise ValueError(f'{type(self).__name__} has no pizza type {pizza_type!r}, '
+                             f'available: {", ".join(map(repr, self._menu))}') from None
+        pizza = pizza_class()
+        if name is not None:
+            pizza.name = name
+        return pizza
+
     @abstractmethod
     def _create_pizza(self, pizza_type) -> Pizza:
         pass
@@ -82,15 +119,17 @@ class PizzaStore(ABC):
 # 纽约披萨店类（实现类）
 class NewYorkPizzaStore(PizzaStore):
     def _create_pizza(self, pizza_type):
-        if pizza_type == 'cheese':
-            return NewYorkStyleCheesePizza()
+        return self._create_menu_item(pizza_type)
 
 
-# 纽约披萨店类（实现类）
+# 芝加哥披萨店类（实现类）
 class ChicagoPizzaStore(PizzaStore):
     def _create_pizza(self, pizza_type):
-        if pizza_type == 'cheese':
-            return ChicagoStyleCheesePizza()
+        return self._create_menu_item(pizza_type)
+
+
+NewYorkPizzaStore.register('cheese', NewYorkStyleCheesePizza)
+ChicagoPizzaStore.register('cheese', ChicagoStyleCheesePizza)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+# 订单日志：把完成的订单按列、字典编码写入二进制文件，读取时内存映射文件，
+# 过滤和计数直接在列的字节上完成，不为每一行解析或创建Python对象。
+#
+# 文件格式：
+#   <path>       文件头 MAGIC，之后是若干数据块；每个数据块是行数（uint32，小端）和各列的编码宽度（每列1个字节，1或2），
+#                之后是各列的编码，每列每行1或2个字节（uint8/uint16，小端），同一列的编码在块内连续存放；
+#                字典不超过256项的列用1个字节，否则用2个字节
+#   <path>.dict  各列的字典（JSON：列名 -> 取值列表，编码即下标），每次写入数据块前更新
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from collections import Counter
+
+MAGIC = b'PZLOG\x02'
+COLUMNS = ('store', 'pizza_class', 'name', 'dough', 'sauce', 'cheese', 'clam')
+MAX_CODES = 1 << 16
+_BLOCK_HEADER = struct.Struct(f'<I{len(COLUMNS)}B')
+
+
+def _dictionary_path(path):
+    return path + '.dict'
+
+
+def _load_dictionaries(path):
+    try:
+        with open(_dictionary_path(path), encoding='utf-8') as f:
+            dictionaries = json.load(f)
+    except FileNotFoundError:
+        dictionaries = {}
+    return {column: dictionaries.get(column, []) for column in COLUMNS}
+
+
+# 扫描数据块，返回([(数据起始位置, 行数, 各列宽度)], 最后一个完整数据块的结束位置)；
+# 末尾写入中途截断的数据块不计入
+def _scan_blocks(read_at, size):
+    blocks = []
+    offset = len(MAGIC)
+    while offset + _BLOCK_HEADER.size <= size:
+        rows, *widths = _BLOCK_HEADER.unpack(read_at(offset, _BLOCK_HEADER.size))
+        start = offset + _BLOCK_HEADER.size
+        end = start + rows * sum(widths)
+        if end > size or any(width not in (1, 2) for width in widths):
+            break
+        blocks.append((start, rows, tuple(widths)))
+        offset = end
+    return blocks, offset
+
+
+def _decode(data, width):
+    if width == 1:
+        return data
+    codes = array('H', data)
+    if sys.byteorder == 'big':
+        codes.byteswap()
+    return codes
+
+
+# 订单日志写入器：订单先在内存中按列编码，攒够block_size行后一次追加一个数据块。
+# 打开已有的日志时先截掉末尾不完整的数据块（上次写入中途崩溃留下的），再继续追加
+class OrderLogWriter:
+    def __init__(self, path, block_size=65536):
+        self.path = path
+        self.block_size = block_size
+        self._dictionaries = _load_dictionaries(path)
+        self._codes = {column: {value: code for code, value in enumerate(values)}
+                       for column, values in self._dictionaries.items()}
+        self._columns = {column: array('H') for column in COLUMNS}
+        self._rows = 0
+        self._file = open(path, 'ab')
+        size = self._file.tell()
+        if size == 0:
+            self._file.write(MAGIC)
+        else:
+            with open(path, 'rb') as f:
+                def read_at(offset, n):
+                    f.seek(offset)
+                    return f.read(n)
+
+                if read_at(0, len(MAGIC)) != MAGIC:
+                    self._file.close()
+                    raise ValueError(f'{path} is not an order log')
+                _, end = _scan_blocks(read_at, size)
+            if end < size:
+                self._file.truncate(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _encode(self, column, value):
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            if len(codes) >= MAX_CODES:
+                raise ValueError(f'column {column!r} supports at most {MAX_CODES} distinct values')
+            code = codes[value] = len(codes)
+            self._dictionaries[column].append(value)
+        return code
+
+    # store可以是披萨店实例或地区名称
+    def append(self, store, pizza):
+        store = store if isinstance(store, str) else type(store).__name__
+        values = (store, type(pizza).__name__, pizza.get_name(), pizza.dough, pizza.sauce, pizza.cheese, pizza.clam)
+        # 先编码整行，全部成功后再追加到各列，被拒绝的行不会让之后的行错位
+        codes = tuple(self._encode(column, '' if value is None else str(value)) for column, value in zip(COLUMNS, values))
+        for column, code in zip(COLUMNS, codes):
+            self._columns[column].append(code)
+        self._rows += 1
+        if self._rows >= self.block_size:
+            self.flush()
+
+    def extend(self, store, pizzas):
+        for pizza in pizzas:
+            self.append(store, pizza)
+
+    def _encode_column(self, column):
+        codes = self._columns[column]
+        if len(self._dictionaries[column]) <= 256:
+            return 1, bytes(array('B', codes))
+        if sys.byteorder == 'big':
+            codes = array('H', codes)
+            codes.byteswap()
+        return 2, codes.tobytes()
+
+    def flush(self):
+        if self._rows:
+            # 先替换字典文件再写数据块：字典只会增长，任何时刻读到的数据块中的编码在字典里都有定义
+            tmp = _dictionary_path(self.path) + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._dictionaries, f, ensure_ascii=False)
+            os.replace(tmp, _dictionary_path(self.path))
+            widths, columns = zip(*(self._encode_column(column) for column in COLUMNS))
+            self._file.write(_BLOCK_HEADER.pack(self._rows, *widths) + b''.join(columns))
+            self._file.flush()
+            for column in self._columns.values():
+                del column[:]
+            self._rows = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+# 订单日志读取器：内存映射日志文件，打开时只扫描数据块的位置
+class OrderLog:
+    def __init__(self, path):
+        self.path = path
+        self.dictionaries = _load_dictionaries(path)
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not an order log')
+        self._blocks, _ = _scan_blocks(lambda offset, n: self._mmap[offset:offset + n], size)  # (数据起始位置, 行数, 各列宽度)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(rows for _, rows, _ in self._blocks)
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    # 某个数据块中某列的原始字节和编码宽度
+    def _column(self, block, column):
+        start, rows, widths = block
+        index = COLUMNS.index(column)
+        start += rows * sum(widths[:index])
+        width = widths[index]
+        return self._mmap[start:start + rows * width], width
+
+    # 过滤条件转换为(列, 匹配的编码集合)
+    def _tables(self, filters):
+        tables = []
+        for column, wanted in filters.items():
+            if column not in COLUMNS:
+                raise ValueError(f'unknown column {column!r}, columns: {", ".join(COLUMNS)}')
+            wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+            tables.append((column, {code for code, value in enumerate(self.dictionaries[column]) if value in wanted}))
+        return tables
+
+    # 某列中编码属于codes的行的掩码（每行一个字节，0或1）：编码经256项的转换表变成0/1；
+    # 2字节编码按高字节分组，高字节、低字节分别转换后按位与
+    def _column_mask(self, block, column, codes):
+        data, width = self._column(block, column)
+        if width == 1:
+            table = bytes(1 if code in codes else 0 for code in range(256))
+            return int.from_bytes(data.translate(table), 'little')
+        low, high = data[0::2], data[1::2]
+        groups = {}
+        for code in codes:
+            groups.setdefault(code >> 8, set()).add(code & 0xFF)
+        mask = 0
+        for hi, lows in groups.items():
+            high_table = bytes(1 if i == hi else 0 for i in range(256))
+            low_table = bytes(1 if i in lows else 0 for i in range(256))
+            mask |= int.from_bytes(high.translate(high_table), 'little') & int.from_bytes(low.translate(low_table), 'little')
+        return mask
+
+    # 某个数据块中满足所有条件的行的掩码
+    def _mask(self, block, tables):
+        mask = None
+        for column, codes in tables:
+            column_mask = self._column_mask(block, column, codes)
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    # 统计满足条件的订单数，例如 count(store='ChicagoPizzaStore', pizza_class='ClamPizza')
+    def count(self, **filters):
+        if not filters:
+            return len(self)
+        tables = self._tables(filters)
+        return sum(self._mask(block, tables).bit_count() for block in self._blocks)
+
+    # 某列各取值的订单数
+    def value_counts(self, column):
+        values = self.dictionaries[column]
+        counts = dict.fromkeys(values, 0)
+        for block in self._blocks:
+            data, width = self._column(block, column)
+            if width == 1:
+                for code, value in enumerate(values[:256]):
+                    counts[value] += data.count(code.to_bytes(1, 'little'))
+            else:
+                for code, n in Counter(_decode(data, width)).items():
+                    counts[values[code]] += n
+        return counts
+
+    # 逐行返回满足条件的订单（只为匹配的行解码）
+    def __iter__(self):
+        return self.iter_orders()
+
+    def iter_orders(self, **filters):
+        tables = self._tables(filters)
+        for block in self._blocks:
+            columns = [_decode(*self._column(block, column)) for column in COLUMNS]
+            if tables:
+                mask = self._mask(block, tables).to_bytes(block[1], 'little')
+                rows = _find_all(mask, 1)
+            else:
+                rows = range(block[1])
+            for row in rows:
+                yield {column: self.dictionaries[column][data[row]] for column, data in zip(COLUMNS, columns)}
+
+
+def _find_all(data, byte):
+    i = data.find(byte)
+    while i != -1:
+        yield i
+        i = data.find(byte, i + 1)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from abstract_factory import NewYorkPizzaStore, ChicagoPizzaStore
+    from output_sink import use_sink, NullSink
+
+    with tempfile.TemporaryDirectory() as tmp, use_sink(NullSink()):
+        path = os.path.join(tmp, 'orders.log')
+        newyork_store, chicago_store = NewYorkPizzaStore(), ChicagoPizzaStore()
+        with OrderLogWriter(path) as writer:
+            for i in range(1000):
+                writer.append(newyork_store, newyork_store.order_pizza('cheese' if i % 2 else 'clam'))
+                writer.append(chicago_store, chicago_store.order_pizza('cheese' if i % 3 else 'clam'))
+
+        with OrderLog(path) as log:
+            print(len(log), log.count(store='ChicagoPizzaStore', pizza_class='ClamPizza'))
+            print(log.value_counts('name'))
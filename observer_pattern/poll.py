@@ -3,8 +3,16 @@
 # 设计原则：为了交互对象之间的松耦合设计而努力。
 
 # 代码实现
+import os
+import sys
 from abc import ABC, abstractmethod
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit
+from observer_pattern.registry import ObserverRegistry
+
 
 # 主题（接口类）
 # Poll模型
@@ -45,13 +53,14 @@ class IObserver(ABC):
 
 
 # 主题 - 天气气象站（实现类）
+# 观察者保存在弱引用注册表中（见registry.py），被回收的观察者自动移除
 class WeatherData(ISubject):
     def __init__(self):
-        self.observers = []
+        self.observers = ObserverRegistry()
         self.message = ''
 
     def register(self, observer: IObserver):
-        self.observers.append(observer)
+        self.observers.add(observer)
 
     def remove(self, observer: IObserver):
         self.observers.remove(observer)
@@ -70,21 +79,21 @@ class WeatherData(ISubject):
 # 观察者 - 当前观测值（实现类）
 class CurrentConditionsDisplay(IObserver):
     def display(self):
-        print('显示当前观测值')
+        emit('显示当前观测值')
 
     def update(self):
         # 这里简化了对接收信息的处理
-        print(f"CurrentConditionsDisplay: {self.subject.get_message()}")
+        emit(f"CurrentConditionsDisplay: {self.subject.get_message()}")
 
 
 # 观察者 - 最小、平均、最大观测值（实现类）
 class StatisticsDisplay(IObserver):
     def display(self):
-        print('显示最小、平均、最大观测值')
+        emit('显示最小、平均、最大观测值')
 
     def update(self):
         # 这里简化了对接收信息的处理
-        print(f"StatisticsDisplay: {self.subject.get_message()}")
+        emit(f"StatisticsDisplay: {self.subject.get_message()}")
 
 
 if __name__ == '__main__':
@@ -3,7 +3,22 @@
 # 设计原则：为了交互对象之间的松耦合设计而努力。
 
 # 代码实现
+import os
+import sys
+import time
+import asyncio
+import inspect
+import weakref
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit
+from observer_pattern.registry import ObserverRegistry
 
 
 # 主题（接口类）
@@ -38,40 +53,294 @@ class IObserver(ABC):
         pass
 
 
+MAILBOX_POLICIES = ('block', 'drop_oldest', 'drop_newest', 'coalesce')
+
+
+# 观察者的有界邮箱：put只把消息放进邮箱，由邮箱自己的投递线程依次调用观察者的update（协程观察者在该线程的事件循环中运行）。
+# 邮箱只弱引用观察者，观察者被回收后剩余的消息计为丢弃。
+# 邮箱满时按policy处理：'block' 阻塞发布者直到有空位；'drop_oldest' 丢弃最旧的一条；'drop_newest' 丢弃新消息。
+# 'coalesce' 不看邮箱是否已满，每次put都替换待投递的消息，邮箱中最多只有最新的一条
+class Mailbox:
+    def __init__(self, observer, maxsize=64, policy='block'):
+        if policy not in MAILBOX_POLICIES:
+            raise ValueError(f'unknown mailbox policy {policy!r}, expected one of {", ".join(MAILBOX_POLICIES)}')
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self._observer = weakref.ref(observer)
+        self.maxsize = maxsize
+        self.policy = policy
+        self._messages = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._busy = False  # 投递线程正在调用update
+        self._stats = {'received': 0, 'delivered': 0, 'dropped': 0, 'errors': 0, 'high_water': 0}
+        self._worker = threading.Thread(target=self._run, name=f'mailbox-{type(observer).__name__}', daemon=True)
+        self._worker.start()
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def observer(self):
+        return self._observer()
+
+    def put(self, message):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('mailbox is closed')
+            self._stats['received'] += 1
+            if self.policy == 'coalesce':
+                self._stats['dropped'] += len(self._messages)
+                self._messages.clear()
+            elif len(self._messages) >= self.maxsize:
+                if self.policy == 'block':
+                    self._condition.wait_for(lambda: len(self._messages) < self.maxsize or self._closed)
+                    if self._closed:
+                        self._stats['dropped'] += 1
+                        return
+                elif self.policy == 'drop_oldest':
+                    self._messages.popleft()
+                    self._stats['dropped'] += 1
+                else:
+                    self._stats['dropped'] += 1
+                    return
+            self._messages.append(message)
+            self._stats['high_water'] = max(self._stats['high_water'], len(self._messages))
+            self._condition.notify_all()
+
+    def _run(self):
+        loop = None
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                self._condition.wait_for(lambda: self._messages or self._closed)
+                if not self._messages:
+                    break
+                message = self._messages.popleft()
+                self._busy = True
+                self._condition.notify_all()  # 唤醒等待空位的发布者
+            observer = self._observer()
+            try:
+                if observer is None:
+                    with self._condition:
+                        self._stats['dropped'] += 1
+                    continue
+                if inspect.iscoroutinefunction(observer.update):
+                    loop = loop or asyncio.new_event_loop()
+                    loop.run_until_complete(observer.update(message))
+                else:
+                    observer.update(message)
+            except Exception:
+                with self._condition:
+                    self._stats['errors'] += 1
+            else:
+                with self._condition:
+                    self._stats['delivered'] += 1
+            finally:
+                del observer
+        if loop is not None:
+            loop.close()
+
+    # 阻塞到邮箱中的消息都已投递，超时返回False
+    def join(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._messages and not self._busy, timeout)
+
+    # drain=True时先投递完邮箱中的消息，否则丢弃它们；wait=True时等待投递线程结束
+    def close(self, drain=True, wait=True):
+        with self._condition:
+            if not drain:
+                self._stats['dropped'] += len(self._messages)
+                self._messages.clear()
+            self._closed = True
+            self._condition.notify_all()
+        if wait and threading.current_thread() is not self._worker:
+            self._worker.join()
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats, size=len(self._messages), maxsize=self.maxsize, policy=self.policy)
+
+
 # 主题 - 天气气象站（实现类）
+# dispatch='sync'：依次同步调用各观察者的update（默认）；
+# dispatch='concurrent'：并发分发，协程观察者（async def update）在后台事件循环中运行，普通观察者在线程池中运行，
+# 每个观察者最多等待timeout秒，某个观察者超时或抛出异常不影响其他观察者，notify返回每个观察者的耗时和结果；
+# dispatch='mailbox'：每个观察者有自己的有界邮箱和投递线程，notify只把消息放进各邮箱，慢的观察者不会拖慢发布者和其他观察者；
+# 邮箱大小和溢出策略默认取mailbox_size和mailbox_policy，观察者类可以用同名属性覆盖，也可以注册后用set_mailbox修改。
+# 观察者保存在弱引用注册表中（见registry.py），被回收的观察者自动移除，其邮箱随之关闭
 class WeatherData(ISubject):
-    def __init__(self):
-        self.observers = []
+    def __init__(self, dispatch='sync', timeout=1.0, max_workers=None, mailbox_size=64, mailbox_policy='block'):
+        if dispatch not in ('sync', 'concurrent', 'mailbox'):
+            raise ValueError(f"unknown dispatch mode {dispatch!r}, expected 'sync', 'concurrent' or 'mailbox'")
+        if mailbox_policy not in MAILBOX_POLICIES:
+            raise ValueError(f'unknown mailbox policy {mailbox_policy!r}, expected one of {", ".join(MAILBOX_POLICIES)}')
+        self.observers = ObserverRegistry(on_discard=self._discard_mailbox)
+        self.dispatch = dispatch
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.mailbox_size = mailbox_size
+        self.mailbox_policy = mailbox_policy
+        self._mailboxes = {}  # 观察者在注册表中的key -> 邮箱
+        self._executor = None
+        self._loop = None
+        self._loop_thread = None
+        self._in_flight = {}  # id(观察者) -> 还没结束的update调用（并发分发）
+        self._lock = threading.Lock()
 
     def register(self, observer: IObserver):
-        self.observers.append(observer)
+        key = self.observers.add(observer)
+        if self.dispatch == 'mailbox' and key not in self._mailboxes:
+            self._mailboxes[key] = Mailbox(observer, getattr(observer, 'mailbox_size', self.mailbox_size),
+                                           getattr(observer, 'mailbox_policy', self.mailbox_policy))
 
     def remove(self, observer: IObserver):
         self.observers.remove(observer)
+        mailbox = self._mailboxes.pop(id(observer), None)
+        if mailbox is not None:
+            mailbox.close(drain=False)
+
+    # 观察者被回收时由注册表调用，可能发生在任意线程，不等待投递线程结束
+    def _discard_mailbox(self, key):
+        mailbox = self._mailboxes.pop(key, None)
+        if mailbox is not None:
+            mailbox.close(drain=False, wait=False)
 
     def notify(self, message):
+        if self.dispatch == 'concurrent':
+            return self._notify_concurrent(message)
+        if self.dispatch == 'mailbox':
+            for key, _ in self.observers.snapshot():
+                mailbox = self._mailboxes.get(key)
+                if mailbox is not None:
+                    mailbox.put(message)
+            return
         for observer in self.observers:
             observer.update(message)
 
+    # 修改某个观察者邮箱的大小或溢出策略
+    def set_mailbox(self, observer: IObserver, maxsize=None, policy=None):
+        if policy is not None and policy not in MAILBOX_POLICIES:
+            raise ValueError(f'unknown mailbox policy {policy!r}, expected one of {", ".join(MAILBOX_POLICIES)}')
+        mailbox = self._mailboxes[id(observer)]
+        with mailbox._condition:
+            mailbox.maxsize = maxsize or mailbox.maxsize
+            mailbox.policy = policy or mailbox.policy
+            mailbox._condition.notify_all()
+
+    # 阻塞到所有邮箱中的消息都已投递
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for mailbox in self._mailboxes.copy().values():
+            if not mailbox.join(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+    # 各观察者邮箱的计数：收到、投递、丢弃、出错的消息数，当前和最高排队长度
+    def mailbox_stats(self):
+        return [dict(mailbox.stats(), observer=mailbox.observer) for mailbox in self._mailboxes.copy().values()]
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='observer')
+            return self._executor
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name='observer-loop', daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    # 返回[{'observer', 'status'('ok'/'error'/'timeout'/'busy'), 'latency'(秒), 'error'}]，顺序与注册顺序一致。
+    # 线程池中超时的update无法中断，会继续占用一个工作线程直到返回；每个观察者同时最多有一次调用，
+    # 上一次调用还没结束的观察者这次跳过（'busy'），卡住的观察者最多占用一个工作线程，不会拖垮其他观察者
+    def _notify_concurrent(self, message):
+        finished = {}
+        futures = {}
+        results = {}
+        start = time.perf_counter()
+        for observer in list(self.observers):
+            key = id(observer)
+            with self._lock:
+                busy = key in self._in_flight
+            if busy:
+                results[key] = {'observer': observer, 'status': 'busy', 'latency': 0.0, 'error': None}
+                continue
+            if inspect.iscoroutinefunction(observer.update):
+                future = asyncio.run_coroutine_threadsafe(observer.update(message), self._event_loop())
+            else:
+                future = self._thread_pool().submit(observer.update, message)
+            with self._lock:
+                self._in_flight[key] = future
+            # 完成回调可能在wait返回之后才执行，此时按检查时间计
+            future.add_done_callback(lambda f: finished.setdefault(f, time.perf_counter()))
+            future.add_done_callback(lambda f, key=key: self._call_finished(key, f))
+            futures[future] = observer
+            results[key] = None  # 占位，保持注册顺序
+        _, not_done = wait(futures, timeout=self.timeout)
+
+        for future, observer in futures.items():
+            if future in not_done:
+                future.cancel()
+                results[id(observer)] = {'observer': observer, 'status': 'timeout', 'latency': time.perf_counter() - start, 'error': None}
+                continue
+            error = future.exception()
+            results[id(observer)] = {'observer': observer, 'status': 'error' if error else 'ok',
+                                     'latency': finished.get(future, time.perf_counter()) - start, 'error': error}
+        return list(results.values())
+
+    def _call_finished(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            loop, self._loop = self._loop, None
+            loop_thread, self._loop_thread = self._loop_thread, None
+            mailboxes, self._mailboxes = self._mailboxes, {}
+        for mailbox in mailboxes.values():
+            mailbox.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if loop is not None:
+            # 取消还没结束的协程（包括已超时的），等它们在事件循环中处理完取消后再停止并关闭事件循环
+            asyncio.run_coroutine_threadsafe(_cancel_pending_tasks(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join()
+            loop.close()
+
+
+async def _cancel_pending_tasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 
 # 观察者 - 当前观测值（实现类）
 class CurrentConditionsDisplay(IObserver):
     def display(self):
-        print('显示当前观测值')
+        emit('显示当前观测值')
 
     def update(self, message):
         # 这里简化了对接收信息的处理
-        print(f"CurrentConditionsDisplay: {message}")
+        emit(f"CurrentConditionsDisplay: {message}")
 
 
 # 观察者 - 最小、平均、最大观测值（实现类）
 class StatisticsDisplay(IObserver):
     def display(self):
-        print('显示最小、平均、最大观测值')
+        emit('显示最小、平均、最大观测值')
 
     def update(self, message):
         # 这里简化了对接收信息的处理
-        print(f"StatisticsDisplay: {message}")
+        emit(f"StatisticsDisplay: {message}")
 
 
 if __name__ == '__main__':
@@ -80,3 +349,22 @@ if __name__ == '__main__':
     sta = StatisticsDisplay(wd)
 
     wd.notify('今天天气晴')
+
+    # 并发分发
+    # wd = WeatherData(dispatch='concurrent', timeout=0.5)
+    # cur = CurrentConditionsDisplay(wd)
+    # sta = StatisticsDisplay(wd)
+    # for result in wd.notify('今天天气晴'):
+    #     print(type(result['observer']).__name__, result['status'], f"{result['latency'] * 1000:.2f}ms")
+    # wd.close()
+
+    # 每个观察者一个有界邮箱
+    # wd = WeatherData(dispatch='mailbox', mailbox_size=8, mailbox_policy='coalesce')
+    # cur = CurrentConditionsDisplay(wd)
+    # sta = StatisticsDisplay(wd)
+    # wd.set_mailbox(sta, policy='drop_oldest')
+    # for i in range(100):
+    #     wd.notify(f'第{i}次观测')
+    # wd.join()
+    # print(wd.mailbox_stats())
+    # wd.close()
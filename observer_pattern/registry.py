@@ -0,0 +1,71 @@
+# 观察者注册表（push.py和poll.py共用）：按注册顺序保存观察者的弱引用，以id(观察者)为key的dict当作有序集合，
+# 注册、移除都是O(1)，重复注册不会产生重复通知；按身份而不是__eq__区分观察者，相等的两个观察者各自注册，
+# 定义了__eq__但不可哈希的观察者也能注册。观察者被回收后其弱引用自动从注册表中删除，
+# 注册表不会让已经不用的观察者一直存活（观察者需要由调用方持有引用）。
+# 遍历时使用注册表的快照（元组），快照只在注册表变化后的第一次遍历时重建，
+# 遍历过程中注册或移除观察者只影响下一次遍历（写时复制）
+import weakref
+import threading
+
+
+# 记住自己在注册表中的key的弱引用，回调时据此删除对应的项
+class _ObserverRef(weakref.ref):
+    __slots__ = ('key',)
+
+
+class ObserverRegistry:
+    def __init__(self, on_discard=None):
+        self._refs = {}  # id(观察者) -> 弱引用，保持注册顺序
+        self._snapshot = ()
+        self._lock = threading.Lock()
+        self._on_discard = on_discard  # 观察者被回收时以其key调用
+
+    # 观察者被回收时由弱引用回调；可能在任意线程、任意位置触发，不获取锁，只做原子的字典操作。
+    # 只删除仍是这个弱引用的项（id可能已被新注册的观察者复用）
+    def _discard(self, ref):
+        if self._refs.get(ref.key) is ref and self._refs.pop(ref.key, None) is not None:
+            self._snapshot = None
+            if self._on_discard is not None:
+                self._on_discard(ref.key)
+
+    # 返回观察者在注册表中的key（即id(观察者)）
+    def add(self, observer):
+        key = id(observer)
+        with self._lock:
+            if key not in self._refs:
+                ref = _ObserverRef(observer, self._discard)
+                ref.key = key
+                self._refs[key] = ref
+                self._snapshot = None
+        return key
+
+    def remove(self, observer):
+        with self._lock:
+            try:
+                del self._refs[id(observer)]
+            except KeyError:
+                raise ValueError(f'{observer!r} is not registered') from None
+            self._snapshot = None
+
+    def __contains__(self, observer):
+        return id(observer) in self._refs
+
+    def __len__(self):
+        return len(self._refs)
+
+    # 当前注册的观察者的(key, 弱引用)（元组）
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    # 先复制再转换，避免弱引用回调在转换过程中修改字典
+                    snapshot = self._snapshot = tuple(self._refs.copy().items())
+        return snapshot
+
+    def __iter__(self):
+        for _, ref in self.snapshot():
+            observer = ref()
+            if observer is not None:
+                yield observer
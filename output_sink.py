@@ -0,0 +1,251 @@
+# 共享输出模块：各设计模式示例中的热点方法（飞行、烘烤、开灯、观察者更新等）通过emit()输出，
+# 而不是直接print，可以按需切换为缓冲、丢弃、内存或异步文件输出，避免逐行写终端的系统调用和锁竞争。
+import sys
+import queue
+import atexit
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+
+# 输出（接口类）
+class OutputSink(ABC):
+    @abstractmethod
+    def write(self, line):
+        pass
+
+    def write_many(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+# 直接输出到标准输出（默认，输出与print一致；一次write调用写出整行，比print快）
+class StdoutSink(OutputSink):
+    def write(self, line):
+        sys.stdout.write(f'{line}\n')
+
+    def write_many(self, lines):
+        print('\n'.join(lines))
+
+
+# 丢弃所有输出
+class NullSink(OutputSink):
+    def write(self, line):
+        pass
+
+    def write_many(self, lines):
+        pass
+
+
+# 输出保存在内存中（用于测试和检查）
+class MemorySink(OutputSink):
+    def __init__(self):
+        self.lines = []
+        self._lock = threading.Lock()
+
+    def write(self, line):
+        with self._lock:
+            self.lines.append(line)
+
+    def write_many(self, lines):
+        with self._lock:
+            self.lines.extend(lines)
+
+    def clear(self):
+        with self._lock:
+            self.lines.clear()
+
+
+# 缓冲输出：攒够max_lines行，或距上次刷新超过max_delay秒时，一次性写入stream
+class BufferedSink(OutputSink):
+    def __init__(self, stream=None, max_lines=1024, max_delay=0.1):
+        self.stream = stream
+        self.max_lines = max_lines
+        self.max_delay = max_delay
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        # 后台线程按时间刷新，保证输出量很小时也不会无限期滞留在缓冲区
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.max_delay):
+            self.flush()
+
+    def write(self, line):
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.max_lines:
+                self._flush_locked()
+
+    def write_many(self, lines):
+        with self._lock:
+            self._buffer.extend(lines)
+            if len(self._buffer) >= self.max_lines:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            stream = self.stream or sys.stdout
+            stream.write('\n'.join(self._buffer) + '\n')
+            stream.flush()
+            self._buffer.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self._flusher.join()
+            atexit.unregister(self.close)
+        self.flush()
+
+
+_STOP = object()
+
+
+# 异步文件输出：write只把行追加到内存批次中，攒够max_batch行的批次交给后台线程写入文件；
+# 待写批次数达到max_pending时write阻塞（背压），后台线程每max_delay秒也会取走未满的批次。
+# 取出批次和放入队列在_enqueue_lock下一起完成，批次按写入顺序进入队列；后台线程只在队列为空、
+# 且没有调用方正在放入批次时才自己取走未满的批次，不会把较新的行写在较早的批次前面
+class AsyncFileSink(OutputSink):
+    def __init__(self, path, mode='a', encoding='utf-8', max_batch=1024, max_delay=0.1, max_pending=64):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._file = open(path, mode, encoding=encoding)
+        self._batch = []
+        self._lock = threading.Lock()  # 保护_batch
+        self._enqueue_lock = threading.Lock()  # 取出批次并放入队列（可能因背压阻塞）期间持有
+        self._queue = queue.Queue(maxsize=max_pending)  # 待写批次（list）或标记
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _take_batch(self):
+        with self._lock:
+            batch, self._batch = self._batch, []
+        return batch
+
+    # 取出当前批次放入队列（调用方持有_enqueue_lock）
+    def _enqueue_batch(self):
+        batch = self._take_batch()
+        if batch:
+            self._queue.put(batch)
+
+    # 按时间刷新：队列为空时取走未满的批次；有调用方正在放入批次时不等待，交给它
+    def _take_pending(self):
+        if not self._enqueue_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._take_batch() if self._queue.empty() else None
+        finally:
+            self._enqueue_lock.release()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.max_delay)
+            except queue.Empty:
+                item = self._take_pending()  # 按时间刷新未满的批次
+                if item is None:
+                    continue
+            if isinstance(item, list):
+                if item:
+                    self._file.write('\n'.join(item) + '\n')
+                    if self._queue.empty():  # 暂时没有更多批次时把文件缓冲区写到磁盘
+                        self._file.flush()
+                continue
+            if item is _STOP:
+                self._file.close()
+                return
+            self._file.flush()
+            item.set()  # 刷新标记（threading.Event）
+
+    def write(self, line):
+        with self._lock:
+            self._batch.append(line)
+            if len(self._batch) < self.max_batch:
+                return
+        with self._enqueue_lock:
+            self._enqueue_batch()
+
+    def write_many(self, lines):
+        with self._lock:
+            self._batch.extend(lines)
+            if len(self._batch) < self.max_batch:
+                return
+        with self._enqueue_lock:
+            self._enqueue_batch()
+
+    # 阻塞到此前写入的行都已写入文件
+    def flush(self):
+        if self._closed:
+            return
+        done = threading.Event()
+        with self._enqueue_lock:
+            self._enqueue_batch()
+            self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            with self._enqueue_lock:
+                self._enqueue_batch()
+                self._queue.put(_STOP)
+            self._writer.join()
+            atexit.unregister(self.close)
+
+
+_sink = StdoutSink()
+# emit()/emit_many()直接调用的函数，切换输出时重新绑定，每次输出不必再查找方法；
+# 默认的StdoutSink为None，由emit()直接写标准输出，热点路径上不多一层方法调用
+_write = None
+_write_many = _sink.write_many
+
+
+def get_sink():
+    return _sink
+
+
+# 设置全局输出，返回之前的输出
+def set_sink(sink: OutputSink):
+    global _sink, _write, _write_many
+    previous, _sink = _sink, sink
+    _write = None if type(sink) is StdoutSink else sink.write
+    _write_many = sink.write_many
+    return previous
+
+
+# 临时切换全局输出：with use_sink(NullSink()): ...
+@contextmanager
+def use_sink(sink: OutputSink):
+    previous = set_sink(sink)
+    try:
+        yield sink
+    finally:
+        sink.flush()
+        set_sink(previous)
+
+
+def emit(line):
+    if _write is None:
+        sys.stdout.write(f'{line}\n')
+    else:
+        _write(line)
+
+
+def emit_many(lines):
+    _write_many(lines)
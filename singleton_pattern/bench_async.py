@@ -0,0 +1,69 @@
+# 单例模式 - 异步单例与线程池卸载的基准测试
+# 用法：python singleton_pattern/bench_async.py [并发数] [稳态调用次数]
+import sys
+import time
+import asyncio
+
+from main import MetaSingletonClass, AsyncSingletonClass
+
+
+# 心跳任务：记录事件循环的最大延迟，用于衡量是否阻塞了事件循环
+async def heartbeat(stop, interval=0.01):
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def run(name, access, reset, concurrency, calls):
+    reset()
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    instances = await asyncio.gather(*(access() for _ in range(concurrency)))
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        await access()
+    per_call = (time.perf_counter() - start) / calls
+
+    stop.set()
+    max_lag = await monitor
+    n_instances = len(set(map(id, instances)))
+    print(f'{name:<24}{cold_time:>11.3f}s{n_instances:>11}{max_lag * 1000:>13.1f}ms{per_call * 1e6:>12.2f}us')
+
+
+# 线程池卸载：在默认线程池中调用同步单例
+async def offload():
+    return await asyncio.get_running_loop().run_in_executor(None, MetaSingletonClass)
+
+
+# 直接在事件循环中调用同步单例（会阻塞事件循环）
+async def blocking():
+    return MetaSingletonClass()
+
+
+def reset_meta():
+    MetaSingletonClass._instance = None
+
+
+def reset_async():
+    AsyncSingletonClass._instances.clear()
+
+
+async def main(concurrency, calls):
+    print(f'{concurrency} concurrent first callers, {calls} steady-state calls')
+    print(f"{'variant':<24}{'cold start':>12}{'instances':>11}{'max loop lag':>15}{'per call':>14}")
+    await run('AsyncSingletonClass', AsyncSingletonClass.get_instance, reset_async, concurrency, calls)
+    await run('run_in_executor', offload, reset_meta, concurrency, calls)
+    await run('blocking call', blocking, reset_meta, concurrency, calls)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 10000))
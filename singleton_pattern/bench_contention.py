@@ -0,0 +1,92 @@
+# 单例模式 - 多线程竞争基准测试
+# 用法：python singleton_pattern/bench_contention.py [线程数] [持续秒数]
+import sys
+import time
+import threading
+
+from main import SingletonClass1, SingletonClass2, MultiThreadSingletonClass1, MultiThreadSingletonClass2, \
+    MetaSingletonClass
+
+
+# 清除缓存的实例，用于测量冷启动
+def _reset_hasattr(cls):
+    def reset():
+        if '_instance' in cls.__dict__:
+            delattr(cls, '_instance')
+
+    return reset
+
+
+def _reset_meta(cls):
+    def reset():
+        cls._instance = None
+
+    return reset
+
+
+VARIANTS = [
+    ('SingletonClass1', SingletonClass1.get_instance, _reset_hasattr(SingletonClass1)),
+    ('SingletonClass2', SingletonClass2, _reset_hasattr(SingletonClass2)),
+    ('MultiThreadSingletonClass1', MultiThreadSingletonClass1.get_instance, _reset_hasattr(MultiThreadSingletonClass1)),
+    ('MultiThreadSingletonClass2', MultiThreadSingletonClass2, _reset_hasattr(MultiThreadSingletonClass2)),
+    ('MetaSingletonClass', MetaSingletonClass, _reset_meta(MetaSingletonClass)),
+]
+
+
+# 冷启动：所有线程同时首次访问，返回耗时和得到的不同实例个数
+def cold_start(access, reset, n_threads):
+    reset()
+    barrier = threading.Barrier(n_threads + 1)
+    instances = set()
+
+    def task():
+        barrier.wait()
+        instances.add(id(access()))
+
+    threads = [threading.Thread(target=task) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, len(instances)
+
+
+# 稳态：实例已创建后，所有线程在duration秒内反复访问，返回每秒访问次数
+def steady_state(access, n_threads, duration):
+    start = time.perf_counter()
+    access()
+    batch = 1 if time.perf_counter() - start > 1e-3 else 100  # 每次访问都会阻塞的变体不做批量
+    barrier = threading.Barrier(n_threads + 1)
+    counts = [0] * n_threads
+
+    def task(i):
+        barrier.wait()
+        n = 0
+        while time.perf_counter() < deadline:
+            for _ in range(batch):
+                access()
+            n += batch
+        counts[i] = n
+
+    threads = [threading.Thread(target=task, args=[i]) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    deadline = start + duration
+    barrier.wait()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    n_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    print(f'{n_threads} threads, {duration}s steady state')
+    print(f"{'variant':<28}{'cold start':>12}{'instances':>11}{'accesses/s':>14}")
+    for name, access, reset in VARIANTS:
+        cold_time, n_instances = cold_start(access, reset, n_threads)
+        ops = steady_state(access, n_threads, duration)
+        print(f'{name:<28}{cold_time:>11.3f}s{n_instances:>11}{ops:>14,.0f}')
@@ -0,0 +1,46 @@
+# 单例模式 - 跨进程单例代理的单次调用开销基准测试
+# 用法：python singleton_pattern/bench_proxy.py [调用次数] [工作进程数]
+import sys
+import time
+import multiprocessing
+
+from main import SingletonManager, SharedCounter
+
+
+def per_call(counter, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        counter.increment()
+    return (time.perf_counter() - start) / calls
+
+
+def worker(counter, calls, results):
+    results.put(per_call(counter, calls))
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    local = per_call(SharedCounter(), calls)
+    print(f"{'local call':<32}{local * 1e6:>10.2f}us")
+
+    manager = SingletonManager()
+    manager.start()
+    counter = manager.get_instance(SharedCounter)
+    proxy = per_call(counter, calls)
+    print(f"{'proxy call (1 process)':<32}{proxy * 1e6:>10.2f}us  ({proxy / local:.0f}x local)")
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(counter, calls, results)) for _ in range(n_workers)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    latencies = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    print(f"{f'proxy call ({n_workers} processes)':<32}{sum(latencies) / n_workers * 1e6:>10.2f}us  "
+          f'({n_workers * calls / elapsed:,.0f} calls/s total)')
+    print(f'final value: {counter.value()}')
+    manager.shutdown()
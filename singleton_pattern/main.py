@@ -1,34 +1,326 @@
 # 单例模式：确保一个类只有一个实例，并提供全局访问点。
+import os
 import time
+import asyncio
+import inspect
+import weakref
+import functools
 import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 
 # 代码实现
+# 单例注册表：记录所有单例，启动时用warm_up()在线程池中并发初始化，
+# 依赖（depends_on）会先于依赖它的单例完成初始化，总耗时约等于最慢的依赖链；
+# fork后子进程中会执行各单例的重置函数，避免继承父进程的实例（socket等）和处于加锁状态的锁
+class SingletonRegistry:
+    _entries = {}  # 名称 -> (获取实例的函数, 依赖的名称)
+    _fork_resets = {}  # 名称 -> fork后在子进程中执行的重置函数
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _name(item):
+        return item if isinstance(item, str) else item.__qualname__
+
+    @classmethod
+    def register(cls, factory, name=None, depends_on=(), reset=None):
+        name = name or cls._name(factory)
+        with cls._lock:
+            cls._entries[name] = (factory, tuple(cls._name(d) for d in depends_on))
+            if reset is not None:
+                cls._fork_resets[name] = reset
+
+    # 只登记fork后的重置函数（不参与预热）
+    @classmethod
+    def at_fork(cls, name, reset):
+        with cls._lock:
+            cls._fork_resets[name] = reset
+
+    @classmethod
+    def unregister(cls, name):
+        with cls._lock:
+            cls._entries.pop(cls._name(name), None)
+            cls._fork_resets.pop(cls._name(name), None)
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls._lock = threading.Lock()
+        for reset in cls._fork_resets.values():
+            reset()
+
+    @classmethod
+    def names(cls):
+        with cls._lock:
+            return list(cls._entries)
+
+    # 并发预热，返回每个单例的初始化耗时（秒）
+    @classmethod
+    def warm_up(cls, max_workers=None):
+        with cls._lock:
+            entries = dict(cls._entries)
+        for name, (_, depends_on) in entries.items():
+            for dependency in depends_on:
+                if dependency not in entries:
+                    raise ValueError(f'{name} depends on unregistered singleton {dependency}')
+
+        def timed(factory):
+            start = time.perf_counter()
+            factory()
+            return time.perf_counter() - start
+
+        durations = {}
+        pending = dict(entries)
+        running = {}  # future -> 名称
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name, (factory, depends_on) in list(pending.items()):
+                    if all(dependency in durations for dependency in depends_on):
+                        running[executor.submit(timed, factory)] = name
+                        del pending[name]
+                if not running:
+                    raise ValueError(f'circular dependency among singletons: {", ".join(pending)}')
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    durations[running.pop(future)] = future.result()  # 初始化失败时异常直接抛出
+        return durations
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonRegistry._after_fork_in_child)
+
+
+# 清除类上缓存的_instance，并换一把新锁
+def _reset_class_instance(cls):
+    def reset():
+        if '_instance' in cls.__dict__:
+            delattr(cls, '_instance')
+        if '_instance_lock' in cls.__dict__:
+            cls._instance_lock = threading.Lock()
+
+    return reset
+
 # 单例类装饰器
 def SingletonDecorator(cls):
     _instances = {}
+    _instance_lock = threading.Lock()
 
     def _singleton(*args, **kwargs):
-        if cls not in _instances:
-            _instances[cls] = cls(*args, **kwargs)
+        if cls not in _instances:  # 第一次查询
+            with _instance_lock:
+                if cls not in _instances:  # 第二次查询
+                    _instances[cls] = cls(*args, **kwargs)
         return _instances[cls]
 
+    def _reset():
+        nonlocal _instance_lock
+        _instances.clear()
+        _instance_lock = threading.Lock()
+
+    functools.update_wrapper(_singleton, cls, updated=())
+    SingletonRegistry.register(_singleton, depends_on=getattr(cls, 'depends_on', ()), reset=_reset)
     return _singleton
 
 
-# 单例类装饰器测试
+# 连接器
+class Connector:
+    def __init__(self, connector_id):
+        self.connector_id = connector_id
+        self.use_count = 0  # 被借出的次数
+
+    def __repr__(self):
+        return f'Connector({self.connector_id})'
+
+
+# 单例类装饰器测试 - 有界、线程安全的连接池
 @SingletonDecorator
 class SingletonDecoratorTest:
-    def __init__(self):
-        self._connector_pool = 5  # 初始化5个连接器的连接池
+    def __init__(self, size=5):
+        self._size = size
+        self._idle = deque(Connector(i) for i in range(size))  # 初始化size个连接器的连接池
+        self._busy_since = {}  # 被借出的连接器 -> 借出时间
+        self._condition = threading.Condition()
+        self._created_at = time.monotonic()
+        # 统计信息
+        self._acquired = 0
+        self._timeouts = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._busy_time = 0.0  # 已归还连接器的累计占用时间
+
+    # 借出连接器，连接池为空时阻塞等待，超时抛出TimeoutError
+    def get_connector(self, timeout=None):
+        start = time.monotonic()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._idle, timeout):
+                self._timeouts += 1
+                raise TimeoutError(f'no connector available within {timeout}s')
+            connector = self._idle.popleft()
+            now = time.monotonic()
+            wait_time = now - start
+            self._acquired += 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+            self._busy_since[connector] = now
+            connector.use_count += 1
+        return connector
+
+    # 归还连接器
+    def release_connector(self, connector):
+        with self._condition:
+            if connector not in self._busy_since:
+                raise ValueError(f'{connector!r} is not borrowed from this pool')
+            self._busy_time += time.monotonic() - self._busy_since.pop(connector)
+            self._idle.append(connector)
+            self._condition.notify()
+
+    # 上下文管理器：with pool.connector() as c: ...，退出时自动归还
+    @contextmanager
+    def connector(self, timeout=None):
+        connector = self.get_connector(timeout)
+        try:
+            yield connector
+        finally:
+            self.release_connector(connector)
+
+    # 等待时间、利用率等统计信息
+    def stats(self):
+        with self._condition:
+            now = time.monotonic()
+            busy_time = self._busy_time + sum(now - since for since in self._busy_since.values())
+            elapsed = now - self._created_at
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._busy_since),
+                'acquired': self._acquired,
+                'timeouts': self._timeouts,
+                'total_wait_time': self._total_wait_time,
+                'avg_wait_time': self._total_wait_time / self._acquired if self._acquired else 0.0,
+                'max_wait_time': self._max_wait_time,
+                'utilization': busy_time / (self._size * elapsed) if elapsed > 0 else 0.0,
+            }
+
+
+# 多例类装饰器：按规范化后的构造参数缓存实例（例如每个DSN一个客户端），
+# 有容量上限，支持LRU和TTL淘汰，淘汰时调用on_evict（默认调用实例的close方法）
+def MultitonDecorator(max_size=128, ttl=None, on_evict=None):
+    def decorator(cls):
+        _instances = OrderedDict()  # key -> (实例, 创建时间)，按最近使用排序
+        _building = {}  # key -> Future，正在锁外创建的实例，同一个key的其他调用方等待它
+        _instance_lock = threading.Lock()
+        _signature = inspect.signature(cls)
+        _var_keyword = next((name for name, parameter in _signature.parameters.items()
+                             if parameter.kind is inspect.Parameter.VAR_KEYWORD), None)
+        _stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+        # 规范化参数：位置参数和关键字参数写法不同但含义相同时得到同一个key；
+        # **kwargs按名称排序成元组，参数不可哈希时给出明确的错误
+        def _make_key(args, kwargs):
+            bound = _signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            if _var_keyword is not None:
+                arguments[_var_keyword] = tuple(sorted(arguments[_var_keyword].items()))
+            key = tuple(arguments.items())
+            try:
+                hash(key)
+            except TypeError:
+                raise TypeError(f'{cls.__qualname__} multiton arguments must be hashable, got {key!r}') from None
+            return key
+
+        def _close(instance):
+            if on_evict is not None:
+                on_evict(instance)
+            elif callable(getattr(instance, 'close', None)):
+                instance.close()
+
+        def _multiton(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            evicted = []
+            with _instance_lock:
+                entry = _instances.get(key)
+                if entry is not None and ttl is not None and time.monotonic() - entry[1] >= ttl:
+                    del _instances[key]
+                    _stats['expirations'] += 1
+                    evicted.append(entry[0])
+                    entry = None
+                if entry is not None:
+                    _instances.move_to_end(key)
+                    _stats['hits'] += 1
+                    return entry[0]
+                future = _building.get(key)
+                building = future is None
+                if building:
+                    future = _building[key] = Future()
+                    _stats['misses'] += 1
+                else:
+                    _stats['hits'] += 1
+            for old in evicted:  # 在锁外执行关闭钩子
+                _close(old)
+            if not building:
+                return future.result()
+            # 在锁外创建实例，慢的构造函数不会阻塞其他key
+            try:
+                instance = cls(*args, **kwargs)
+            except BaseException as e:
+                with _instance_lock:
+                    _building.pop(key, None)
+                future.set_exception(e)
+                raise
+            evicted = []
+            with _instance_lock:
+                _building.pop(key, None)
+                _instances[key] = (instance, time.monotonic())
+                while len(_instances) > max_size:
+                    _, (old, _) = _instances.popitem(last=False)
+                    _stats['evictions'] += 1
+                    evicted.append(old)
+            future.set_result(instance)
+            for old in evicted:
+                _close(old)
+            return instance
+
+        # 命中、未命中、淘汰统计
+        def stats():
+            with _instance_lock:
+                return dict(_stats, size=len(_instances), max_size=max_size)
 
-    def get_connector(self):
-        if self._connector_pool > 0:
-            connector = self._connector_pool
-            self._connector_pool -= 1  # 连接池中的连接器-1
-            return connector  # 返回连接器
-        else:
-            return -1
+        # 关闭并清空所有实例
+        def clear():
+            with _instance_lock:
+                instances = [instance for instance, _ in _instances.values()]
+                _instances.clear()
+            for instance in instances:
+                _close(instance)
+
+        # fork后子进程直接丢弃继承的实例（不调用关闭钩子，避免影响父进程的连接）
+        def _reset():
+            nonlocal _instance_lock
+            _instances.clear()
+            _building.clear()
+            _instance_lock = threading.Lock()
+
+        SingletonRegistry.at_fork(f'{cls.__qualname__}[multiton]', _reset)
+        _multiton.stats = stats
+        _multiton.clear = clear
+        return _multiton
+
+    return decorator
+
+
+# 多例类装饰器测试 - 每个DSN一个数据库客户端
+@MultitonDecorator(max_size=2, ttl=60)
+class MultitonDecoratorTest:
+    def __init__(self, dsn, timeout=10):
+        self.dsn = dsn
+        self.timeout = timeout
+        self.closed = False
+
+    def close(self):
+        self.closed = True
 
 
 # 单例类 - 懒汉
@@ -93,11 +385,161 @@ class MultiThreadSingletonClass2:
         return MultiThreadSingletonClass2._instance
 
 
+SingletonRegistry.register(SingletonClass1.get_instance, 'SingletonClass1',
+                           reset=_reset_class_instance(SingletonClass1))
+SingletonRegistry.register(SingletonClass2, 'SingletonClass2', reset=_reset_class_instance(SingletonClass2))
+SingletonRegistry.register(MultiThreadSingletonClass1.get_instance, 'MultiThreadSingletonClass1',
+                           reset=_reset_class_instance(MultiThreadSingletonClass1))
+SingletonRegistry.register(MultiThreadSingletonClass2, 'MultiThreadSingletonClass2',
+                           reset=_reset_class_instance(MultiThreadSingletonClass2))
+
+
+# 单例元类：首次构造时加锁并只执行一次__init__，之后的访问只是一次属性读取（无锁、无反射）
+class SingletonMeta(type):
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        cls._instance = None  # 每个类（包括子类）各自持有实例
+        cls._instance_lock = threading.Lock()
+        if bases:  # 不登记Singleton基类本身
+            SingletonRegistry.register(cls, depends_on=getattr(cls, 'depends_on', ()), reset=cls._reset)
+
+    # 清除实例并换一把新锁
+    def _reset(cls):
+        cls._instance = None
+        cls._instance_lock = threading.Lock()
+
+    def __call__(cls, *args, **kwargs):
+        instance = cls._instance
+        if instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__call__(*args, **kwargs)
+                instance = cls._instance
+        return instance
+
+
+# 单例基类：继承即可获得单例行为
+class Singleton(metaclass=SingletonMeta):
+    @classmethod
+    def get_instance(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+
+# 多线程单例类 - 利用元类实现
+class MetaSingletonClass(Singleton):
+    def __init__(self, *args, **kwargs):
+        time.sleep(1)  # 只在第一次构造时执行
+
+
+# 异步单例基类：不阻塞事件循环，实例按事件循环隔离，
+# 并发的首次调用共享同一个初始化任务，初始化失败时所有等待者都收到异常，之后可以重试
+class AsyncSingleton:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instances = weakref.WeakKeyDictionary()  # 事件循环 -> 实例
+        cls._init_tasks = weakref.WeakKeyDictionary()  # 事件循环 -> 进行中的初始化任务
+        SingletonRegistry.at_fork(cls.__qualname__, cls._reset)
+
+    @classmethod
+    def _reset(cls):
+        cls._instances = weakref.WeakKeyDictionary()
+        cls._init_tasks = weakref.WeakKeyDictionary()
+
+    # 异步初始化（子类实现）
+    async def _async_init(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    async def _create(cls, loop, args, kwargs):
+        try:
+            instance = cls()
+            await instance._async_init(*args, **kwargs)
+            cls._instances[loop] = instance
+            return instance
+        finally:
+            del cls._init_tasks[loop]  # 无论成功失败都清除，失败后下一次调用会重试
+
+    @classmethod
+    async def get_instance(cls, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        instance = cls._instances.get(loop)
+        if instance is not None:
+            return instance
+        task = cls._init_tasks.get(loop)
+        if task is None:
+            task = cls._init_tasks[loop] = loop.create_task(cls._create(loop, args, kwargs))
+        # shield：某个等待者被取消时不影响其他等待者共享的初始化任务
+        return await asyncio.shield(task)
+
+
+# 异步单例类
+class AsyncSingletonClass(AsyncSingleton):
+    async def _async_init(self, *args, **kwargs):
+        await asyncio.sleep(1)  # 异步阻塞，期间事件循环可以处理其他任务
+
+
+# 跨进程共享单例的管理器：由一个管理进程持有实例，工作进程通过本地代理调用其方法
+class SingletonManager(BaseManager):
+    def get_instance(self, cls, *args, **kwargs):
+        return getattr(self, cls.__qualname__)(*args, **kwargs)
+
+
+_shared_instances = {}
+_shared_instance_lock = threading.Lock()
+
+
+# 在管理进程中执行，每个类只创建一个实例
+def _get_shared_instance(cls, *args, **kwargs):
+    with _shared_instance_lock:
+        if cls not in _shared_instances:
+            _shared_instances[cls] = cls(*args, **kwargs)
+        return _shared_instances[cls]
+
+
+# 跨进程单例类装饰器（可选）：登记到SingletonManager，需在启动管理器、fork工作进程之前使用
+def SharedSingletonDecorator(cls):
+    SingletonManager.register(cls.__qualname__, callable=functools.partial(_get_shared_instance, cls))
+    return cls
+
+
+# 跨进程单例类 - 计数器
+@SharedSingletonDecorator
+class SharedCounter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()  # 管理进程用多个线程处理代理请求
+
+    def increment(self, n=1):
+        with self._lock:
+            self._value += n
+            return self._value
+
+    def value(self):
+        return self._value
+
+
 if __name__ == '__main__':
     # 单例类装饰器
-    # test = SingletonDecoratorTest()
-    # for i in range(5):
-    #     print(test.get_connector())
+    # def task():
+    #     pool = SingletonDecoratorTest()
+    #     with pool.connector(timeout=5) as connector:
+    #         time.sleep(0.1)
+    #         print(connector)
+    #
+    #
+    # threads = [threading.Thread(target=task) for _ in range(20)]
+    # for t in threads:
+    #     t.start()
+    # for t in threads:
+    #     t.join()
+    # print(SingletonDecoratorTest().stats())
+
+    # 多例类装饰器
+    # a = MultitonDecoratorTest('postgres://a')
+    # print(a is MultitonDecoratorTest(dsn='postgres://a', timeout=10))
+    # MultitonDecoratorTest('postgres://b')
+    # MultitonDecoratorTest('postgres://c')  # 超出容量，淘汰最久未使用的a
+    # print(a.closed, MultitonDecoratorTest.stats())
 
     # 单例类 - 多线程懒汉（不适合多线程）
     # def task(arg):
@@ -138,4 +580,41 @@ if __name__ == '__main__':
     # for i in range(10):
     #     t = threading.Thread(target=task2)
     #     t.start()
+
+    # 元类单例类
+    # def task3():
+    #     obj = MetaSingletonClass()
+    #     print(obj)
+    #
+    #
+    # for i in range(10):
+    #     t = threading.Thread(target=task3)
+    #     t.start()
+
+    # 异步单例类
+    # async def task4():
+    #     objs = await asyncio.gather(*(AsyncSingletonClass.get_instance() for _ in range(10)))
+    #     print(set(objs))
+    #
+    #
+    # asyncio.run(task4())
+
+    # 启动预热：并发初始化所有登记的单例
+    # start = time.perf_counter()
+    # print(SingletonRegistry.warm_up())
+    # print(f'total {time.perf_counter() - start:.2f}s')
+
+    # fork后子进程得到新的单例
+    # parent = MetaSingletonClass()
+    # if os.fork() == 0:
+    #     print(MetaSingletonClass() is parent)  # False
+    #     os._exit(0)
+
+    # 跨进程共享单例
+    # manager = SingletonManager()
+    # manager.start()
+    # counter = manager.get_instance(SharedCounter)
+    # counter.increment()
+    # print(manager.get_instance(SharedCounter).value())
+    # manager.shutdown()
     pass
@@ -0,0 +1,93 @@
+# 策略模式 - 享元行为 + __slots__鸭子的内存/吞吐基准测试
+# 用法：python strategy_pattern/bench_ducks.py [鸭子数量]
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from main import MallardDuck, FlyNoWay, Flock
+
+
+# 改造前的实现：每只鸭子有自己的__dict__，并各自创建一份无状态的行为对象
+class LegacyFlyWithWings:
+    def fly(self):
+        print('用翅膀飞')
+
+
+class LegacyQuack:
+    def quack(self):
+        print('呱呱叫')
+
+
+class LegacyMallardDuck:
+    def __init__(self):
+        self.display_name = '野鸭'
+        self.fly_behavior = LegacyFlyWithWings()
+        self.quack_behavior = LegacyQuack()
+
+    def perform_fly(self):
+        self.fly_behavior.fly()
+
+    def perform_quack(self):
+        self.quack_behavior.quack()
+
+
+def memory(duck_class, n):
+    tracemalloc.start()
+    ducks = [duck_class() for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, ducks
+
+
+def throughput(ducks):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        for duck in ducks:
+            duck.perform_fly()
+            duck.perform_quack()
+        return len(ducks) / (time.perf_counter() - start)
+
+
+def flock_memory(n):
+    tracemalloc.start()
+    flock = Flock()
+    duck = MallardDuck()
+    flock.add_duck(duck.display_name, duck.fly_behavior, duck.quack_behavior, count=n)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, flock
+
+
+def flock_throughput(flock):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        flock.perform_fly()
+        flock.perform_quack()
+        return len(flock) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f'{n:,} ducks')
+    print(f"{'variant':<20}{'memory':>12}{'bytes/duck':>12}{'ducks/s':>14}")
+    results = {}
+    for name, duck_class in [('legacy', LegacyMallardDuck), ('flyweight+slots', MallardDuck)]:
+        size, ducks = memory(duck_class, n)
+        ops = throughput(ducks)
+        del ducks
+        results[name] = size
+        print(f'{name:<20}{size / 2 ** 20:>10.1f}MB{size / n:>12.1f}{ops:>14,.0f}')
+
+    size, flock = flock_memory(n)
+    ops = flock_throughput(flock)
+    results['flock'] = size
+    print(f"{'flock (columnar)':<20}{size / 2 ** 20:>10.1f}MB{size / n:>12.1f}{ops:>14,.0f}")
+    for name in ['flyweight+slots', 'flock']:
+        print(f"memory reduction ({name}): {results['legacy'] / results[name]:.1f}x")
+
+    mask = bytes(i % 2 for i in range(n))
+    start = time.perf_counter()
+    flock.set_fly_behavior(FlyNoWay(), mask)
+    print(f'masked strategy swap on half the flock: {(time.perf_counter() - start) * 1000:.1f}ms')
@@ -5,56 +5,119 @@
 # 设计原则：针对接口编程，而不是针对实现编程。
 
 # 代码实现
+import os
+import sys
+import time
+import threading
 from abc import ABC, abstractmethod
+from array import array
+from itertools import compress
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 共享的output_sink模块在仓库根目录
+if _ROOT not in sys.path:  # 多个模块都会执行这里，只添加一次
+    sys.path.append(_ROOT)
+from output_sink import emit, emit_many
+
+
+# 享元行为（基类）：行为对象没有状态，每个实现类只创建一个实例，由所有鸭子共享
+class FlyweightBehavior:
+    __slots__ = ()
+    _instances = {}
+
+    def __new__(cls):
+        instance = FlyweightBehavior._instances.get(cls)
+        if instance is None:
+            instance = FlyweightBehavior._instances.setdefault(cls, super().__new__(cls))
+        return instance
 
 
 # 飞行行为（接口类）
-class IFlyBehavior(ABC):
+class IFlyBehavior(FlyweightBehavior, ABC):
+    __slots__ = ()
+
     @abstractmethod
     def fly(self):
         pass
 
+    # 批量执行：indices是共用该行为的一组鸭子的下标
+    def fly_batch(self, indices):
+        for _ in indices:
+            self.fly()
+
 
 # 飞行行为 - 有翅膀飞行（实现类）
 class FlyWithWings(IFlyBehavior):
+    __slots__ = ()
+
     def fly(self):
-        print('用翅膀飞')
+        emit('用翅膀飞')
+
+    def fly_batch(self, indices):
+        if indices:
+            emit_many(['用翅膀飞'] * len(indices))
 
 
 # 飞行行为 - 不会飞（实现类）
 class FlyNoWay(IFlyBehavior):
+    __slots__ = ()
+
     def fly(self):
-        print('不会飞')
+        emit('不会飞')
+
+    def fly_batch(self, indices):
+        if indices:
+            emit_many(['不会飞'] * len(indices))
 
 
 # 叫的行为（接口类）
-class IQuackBehavior(ABC):
+class IQuackBehavior(FlyweightBehavior, ABC):
+    __slots__ = ()
+
     @abstractmethod
     def quack(self):
         pass
 
+    # 批量执行：indices是共用该行为的一组鸭子的下标
+    def quack_batch(self, indices):
+        for _ in indices:
+            self.quack()
+
 
 # 叫的行为 - 呱呱叫（实现类）
 class Quack(IQuackBehavior):
+    __slots__ = ()
+
     def quack(self):
-        print('呱呱叫')
+        emit('呱呱叫')
+
+    def quack_batch(self, indices):
+        if indices:
+            emit_many(['呱呱叫'] * len(indices))
 
 
 # 叫的行为 - 吱吱叫（实现类）
 class Squeak(IQuackBehavior):
+    __slots__ = ()
+
     def quack(self):
-        print('吱吱叫')
+        emit('吱吱叫')
 
+    def quack_batch(self, indices):
+        if indices:
+            emit_many(['吱吱叫'] * len(indices))
 
-# 鸭子类
+
+# 鸭子类（使用__slots__，大量鸭子时不为每个实例分配__dict__；名称是类属性，不占实例内存）
 class Duck:
-    def __init__(self):
-        self.display_name = '鸭子'
-        self.fly_behavior = IFlyBehavior()
-        self.quack_behavior = IQuackBehavior()
+    __slots__ = ('fly_behavior', 'quack_behavior')
+    display_name = '鸭子'
+
+    def __init__(self, fly_behavior: IFlyBehavior, quack_behavior: IQuackBehavior):
+        self.fly_behavior = fly_behavior
+        self.quack_behavior = quack_behavior
 
     def display(self):
-        print(self.display_name)
+        emit(self.display_name)
 
     def perform_fly(self):
         self.fly_behavior.fly()
@@ -65,14 +128,197 @@ class Duck:
 
 # 野鸭
 class MallardDuck(Duck):
+    __slots__ = ()
+    display_name = '野鸭'
+
     def __init__(self):
-        self.display_name = '野鸭'
         self.fly_behavior = FlyWithWings()
         self.quack_behavior = Quack()
 
 
+# 鸭群：按列存储鸭子（行为编码、名称编码各一列，名称驻留在名称表中），
+# 执行时每种行为对共用它的一组鸭子只调用一次批量方法
+class Flock:
+    def __init__(self, ducks=()):
+        self._names = []  # 名称表
+        self._name_codes = {}  # 名称 -> 编码
+        self._behaviors = []  # 行为表（享元行为对象）
+        self._behavior_codes = {}  # 行为 -> 编码
+        self.names = array('I')  # 每只鸭子的名称编码
+        self.fly_codes = bytearray()  # 每只鸭子的飞行行为编码
+        self.quack_codes = bytearray()  # 每只鸭子的叫声行为编码
+        for duck in ducks:
+            self.add(duck)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _name_code(self, name):
+        code = self._name_codes.get(name)
+        if code is None:
+            code = self._name_codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def _behavior_code(self, behavior):
+        code = self._behavior_codes.get(behavior)
+        if code is None:
+            if len(self._behaviors) > 255:
+                raise ValueError('a flock supports at most 256 distinct behaviors')
+            code = self._behavior_codes[behavior] = len(self._behaviors)
+            self._behaviors.append(behavior)
+        return code
+
+    def add(self, duck: Duck):
+        self.add_duck(duck.display_name, duck.fly_behavior, duck.quack_behavior)
+
+    def add_duck(self, name, fly_behavior: IFlyBehavior, quack_behavior: IQuackBehavior, count=1):
+        self.names.extend([self._name_code(name)] * count)
+        self.fly_codes.extend(bytes([self._behavior_code(fly_behavior)]) * count)
+        self.quack_codes.extend(bytes([self._behavior_code(quack_behavior)]) * count)
+
+    # 第i只鸭子的(名称, 飞行行为, 叫声行为)
+    def get(self, i):
+        return self._names[self.names[i]], self._behaviors[self.fly_codes[i]], self._behaviors[self.quack_codes[i]]
+
+    # 按行为分组：行为 -> 使用它的鸭子下标
+    def groups(self, codes):
+        indices = range(len(codes))
+        return {self._behaviors[code]: list(compress(indices, map(code.__eq__, codes)))
+                for code in set(codes)}
+
+    def perform_fly(self):
+        for behavior, indices in self.groups(self.fly_codes).items():
+            behavior.fly_batch(indices)
+
+    def perform_quack(self):
+        for behavior, indices in self.groups(self.quack_codes).items():
+            behavior.quack_batch(indices)
+
+    # 用掩码（长度与鸭群相同，真值表示替换）整体替换一部分鸭子的行为，mask为None时替换全部
+    def _replace(self, codes, code, mask):
+        n = len(codes)
+        if mask is None:
+            codes[:] = bytes([code]) * n
+            return
+        if not isinstance(mask, (bytes, bytearray)):
+            mask = bytes(map(bool, mask))
+        if len(mask) != n:
+            raise ValueError(f'mask length {len(mask)} does not match flock size {n}')
+        # 按字节做 codes = mask ? code : codes，整列用大整数位运算一次完成
+        select = int.from_bytes(mask.translate(_MASK_TABLE), 'big')
+        fill = int.from_bytes(bytes([code]) * n, 'big')
+        merged = (int.from_bytes(codes, 'big') & ~select) | (fill & select)
+        codes[:] = merged.to_bytes(n, 'big')
+
+    def set_fly_behavior(self, fly_behavior: IFlyBehavior, mask=None):
+        self._replace(self.fly_codes, self._behavior_code(fly_behavior), mask)
+
+    def set_quack_behavior(self, quack_behavior: IQuackBehavior, mask=None):
+        self._replace(self.quack_codes, self._behavior_code(quack_behavior), mask)
+
+
+_MASK_TABLE = bytes([0x00]) + bytes([0xFF]) * 255  # 掩码字节：0 -> 0x00，非0 -> 0xFF
+
+
+# 自适应策略的分桶状态
+class _AdaptiveBucket:
+    __slots__ = ('best', 'remaining', 'probe_index', 'latency', 'calls', 'probes', 'switches')
+
+    def __init__(self, n_strategies):
+        self.best = None  # 当前选中的实现
+        self.remaining = 0  # 下次重新测速前还可以直接使用best的次数
+        self.probe_index = 0  # 本轮测速进行到第几次
+        self.latency = [None] * n_strategies  # 各实现的平均耗时（指数滑动平均，秒）
+        self.calls = 0
+        self.probes = 0
+        self.switches = 0
+
+
+# 自适应策略：包装同一接口的多个可互换实现（例如多个IFlyBehavior），
+# 按输入规模（第一个参数的长度，按2的幂分桶）分别在线测速，把调用路由到最快的实现；
+# 每轮测速每个实现采样samples次，之后reprobe_interval次调用直接使用最快的实现（不计时），再重新测速
+class AdaptiveStrategy:
+    def __init__(self, strategies, samples=3, reprobe_interval=1000, alpha=0.3):
+        if not strategies:
+            raise ValueError('AdaptiveStrategy needs at least one strategy')
+        if samples < 1:
+            raise ValueError('samples must be at least 1')
+        if reprobe_interval < 0:
+            raise ValueError('reprobe_interval must not be negative')
+        self.strategies = list(strategies)
+        self.samples = samples
+        self.reprobe_interval = reprobe_interval
+        self.alpha = alpha  # 滑动平均中新样本的权重
+        self._buckets = {}  # (方法名, 规模桶) -> _AdaptiveBucket
+        self._lock = threading.Lock()
+
+    # 以接口方法的形式调用：adaptive.fly()、adaptive.fly_batch(indices)
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def call(self, name, *args, **kwargs):
+        size = len(args[0]) if args and hasattr(args[0], '__len__') else 0
+        key = (name, size.bit_length())
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, _AdaptiveBucket(len(self.strategies)))
+        if bucket.remaining > 0:  # 快速路径：不计时
+            bucket.remaining -= 1
+            bucket.calls += 1
+            return getattr(bucket.best, name)(*args, **kwargs)
+
+        i = bucket.probe_index % len(self.strategies)
+        start = time.perf_counter()
+        result = getattr(self.strategies[i], name)(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            latency = bucket.latency[i]
+            bucket.latency[i] = elapsed if latency is None else latency + self.alpha * (elapsed - latency)
+            bucket.calls += 1
+            bucket.probes += 1
+            bucket.probe_index += 1
+            if bucket.probe_index >= len(self.strategies) * self.samples:
+                best = self.strategies[min(range(len(self.strategies)), key=bucket.latency.__getitem__)]
+                if best is not bucket.best:
+                    bucket.switches += 1
+                bucket.best = best
+                bucket.probe_index = 0
+                bucket.remaining = self.reprobe_interval
+        return result
+
+    # 各方法、各规模桶的选择结果和测得的耗时
+    def stats(self):
+        with self._lock:
+            return {
+                key: {
+                    'chosen': type(bucket.best).__name__ if bucket.best is not None else None,
+                    'latency': {type(strategy).__name__: latency
+                                for strategy, latency in zip(self.strategies, bucket.latency)},
+                    'calls': bucket.calls,
+                    'probes': bucket.probes,
+                    'switches': bucket.switches,
+                }
+                for key, bucket in self._buckets.items()
+            }
+
+
 if __name__ == '__main__':
     md = MallardDuck()
     md.display()
     md.perform_fly()
     md.perform_quack()
+
+    # 鸭群
+    # flock = Flock([MallardDuck() for _ in range(5)])
+    # flock.set_fly_behavior(FlyNoWay(), [i % 2 for i in range(len(flock))])
+    # flock.perform_fly()
+
+    # 自适应策略
+    # adaptive = AdaptiveStrategy([FlyWithWings(), FlyNoWay()], reprobe_interval=10)
+    # for _ in range(30):
+    #     adaptive.fly_batch(range(100))
+    # print(adaptive.stats())